@@ -10,13 +10,19 @@ e.g. alignment, edit distances, and symmetric deletion searches.
 from __future__ import unicode_literals, print_function, absolute_import
 from __future__ import division
 
-import codecs
+import os
+import sys
 import numpy
 import operator
 import unicodedata
 import itertools
 import mmap
 import math
+import struct
+import bisect
+import hashlib
+
+from collections import OrderedDict
 
 from nidaba.nidabaexceptions import NidabaAlgorithmException
 
@@ -37,17 +43,115 @@ def sanitize(string, encoding=u'utf-8', normalization=u'NFD'):
     return unicodedata.normalize(normalization, string.strip())
 
 
+# Maximum number of strings memoized by cached_sanitize
+sanitize_cache_size = 131072
+
+# current and previous generation of memoized strings
+_sanitize_cache = [{}, {}]
+_sanitize_stats = {'hits': 0, 'misses': 0}
+
+
+def cached_sanitize(string, encoding=u'utf-8', normalization=u'NFD'):
+    """
+    Memoizing version of sanitize for highly repetitive input such as the
+    tokens of a corpus or OCR record.
+
+    Results are kept in two generations of at most sanitize_cache_size / 2
+    entries each. When the current generation is full it replaces the
+    previous one and strings of the discarded generation not used since are
+    evicted, approximating a least recently used cache with plain
+    dictionaries.
+    """
+    key = (string, encoding, normalization)
+    current = _sanitize_cache[0]
+    if key in current:
+        _sanitize_stats['hits'] += 1
+        return current[key]
+    if key in _sanitize_cache[1]:
+        _sanitize_stats['hits'] += 1
+        ret = _sanitize_cache[1][key]
+    else:
+        _sanitize_stats['misses'] += 1
+        ret = sanitize(string, encoding, normalization)
+    if len(current) >= sanitize_cache_size // 2:
+        _sanitize_cache[1] = current
+        current = _sanitize_cache[0] = {}
+    current[key] = ret
+    return ret
+
+
+def sanitize_cache_info():
+    """
+    Returns a dictionary containing the number of hits, misses, and strings
+    currently memoized by cached_sanitize.
+    """
+    return {'hits': _sanitize_stats['hits'],
+            'misses': _sanitize_stats['misses'],
+            'size': len(_sanitize_cache[0]) + len(_sanitize_cache[1]),
+            'maxsize': sanitize_cache_size}
+
+
+def clear_sanitize_cache():
+    """
+    Empties the cache of cached_sanitize and resets its counters.
+    """
+    _sanitize_cache[:] = [{}, {}]
+    _sanitize_stats['hits'] = _sanitize_stats['misses'] = 0
+
+
 def strings_by_deletion(unistr, dels):
     """
     Compute the unique strings which can be formed from a string by
     deleting the specified number of characters from it. The results
     are sorted in ascending order.
     """
-    new_words = set()
-    for comb in itertools.combinations(range(len(unistr)), dels):
-        new_words.add(u''.join((c for i, c in enumerate(unistr) if i not in
-                                comb)))
-    return sorted(list(new_words))
+    return sorted(deletion_variants(unistr, dels))
+
+
+def deletion_variants(unistr, dels):
+    """
+    Yields the unique strings which can be formed from a string by deleting
+    the specified number of characters from it in no particular order.
+
+    Instead of deleting every combination of positions and removing
+    duplicates afterwards the variants are built by choosing the characters
+    to keep, each one at its first occurrence after the previously kept
+    character. As deleting any character of a run of identical characters
+    results in the same string, every variant is only produced once.
+
+    Args:
+        unistr (unicode): Input string
+        dels (int): Number of characters to delete
+
+    Yields:
+        A unique deletion variant of unistr.
+    """
+    keep = len(unistr) - dels
+    if dels < 0 or keep < 0:
+        return
+    if keep == 0:
+        yield u''
+        return
+    # first occurrence of each character at or after each position
+    nexts = [None] * (len(unistr) + 1)
+    nexts[-1] = {}
+    for i in xrange(len(unistr) - 1, -1, -1):
+        nexts[i] = dict(nexts[i + 1])
+        nexts[i][unistr[i]] = i
+    stack = [(0, u'')]
+    while stack:
+        pos, prefix = stack.pop()
+        need = keep - len(prefix)
+        if need == len(unistr) - pos:
+            # no deletions left
+            yield prefix + unistr[pos:]
+            continue
+        for c, i in nexts[pos].iteritems():
+            if len(unistr) - i >= need:
+                if need == 1:
+                    yield prefix + c
+                else:
+                    stack.append((i + 1, prefix + c))
 
 
 def sym_suggest(ustr, dic, delete_dic, depth, ret_count=0):
@@ -58,7 +162,7 @@ def sym_suggest(ustr, dic, delete_dic, depth, ret_count=0):
     ...]}.
     """
     suggestions = set()
-    dels = strings_by_deletion(ustr, depth)
+    dels = deletion_variants(ustr, depth)
     if ustr in dic:
         suggestions.add(ustr)
 
@@ -78,20 +182,45 @@ def parse_del_dict_entry(entry):
                                      for word in entry.split(u' ')]
 
 
-def suggestions(ustr, sugs, freq=None):
+def suggestions(ustr, sugs, freq=None, max_distance=None):
     """
     Call mapped_sym_suggest, and return the suggestions as a
     sorted list. Python's built in sort is stable, so we can
     simply sort repeatedly, from least important aspect to
-    most important.
+    most important. Suggestions further than max_distance away
+    from ustr are ranked as if they were at max_distance + 1.
+    Suggestions with the same edit distance are ranked by their
+    frequency in the mapping freq (if given) in descending order,
+    i.e. the most frequent suggestion comes first. Suggestions missing
+    from freq have a frequency of 0.
+    """
+    return [sug for sug, _ in ranked_suggestions(ustr, sugs, freq,
+                                                 max_distance)]
+
+
+def ranked_suggestions(ustr, sugs, freq=None, max_distance=None):
+    """
+    Sorts suggestions like suggestions() but returns a list of tuples
+    (suggestion, edit distance). The edit distances to all suggestions are
+    calculated at once by edit_distances.
+    """
+    sugs = list(sugs)
+    distances = edit_distances(ustr, sugs, max_distance=max_distance)
+    return rank_distances(zip(sugs, distances), freq)
+
+
+def rank_distances(distances, freq=None):
     """
-    sugs = sorted(sugs)  # Alphabetic sort
+    Sorts (suggestion, edit distance) tuples like ranked_suggestions() for
+    suggestions whose edit distances are already known, e.g. from
+    DAWG.search.
+    """
+    ranked = sorted(distances)  # Alphabetic sort
     if freq is not None:
-        sugs = sorted(sorted(sugs), key=lambda x: freq[x])  # By frequency
+        # By frequency, most frequent first
+        ranked.sort(key=lambda x: freq.get(x[0], 0), reverse=True)
     # By edit distance
-    sugs = sorted(sugs, key=lambda x: edit_distance(ustr, x))
-
-    return sugs
+    return sorted(ranked, key=operator.itemgetter(1))
 
 
 def mapped_sym_suggest(ustr, del_dic_path, dic, depth, ret_count=0):
@@ -99,30 +228,87 @@ def mapped_sym_suggest(ustr, del_dic_path, dic, depth, ret_count=0):
     Generate a list of spelling suggestions using the memory mapped
     dictionary search/symmetric delete algorithm. Return only
     suggestions at the specified depth, not up to and including that
-    depth.
+    depth. The deletion dictionary may either be a sorted text file or a
+    hashed deletion dictionary (see hashed_del_dict_lookup).
+    """
+    if is_hashed_del_dict(del_dic_path):
+        def del_lookup(s):
+            return hashed_del_dict_lookup(s, del_dic_path) or []
+    else:
+        def del_lookup(s):
+            return parse_del_dict_entry(mmap_bin_search(s, del_dic_path))
+    return _sym_suggestions(ustr, deletion_variants(ustr, depth),
+                            del_lookup, dic.__contains__, depth)
+
+
+def bulk_mapped_sym_suggest(ustrs, del_dic_path, dic_path, depth):
+    """
+    Generate spelling suggestions for a collection of strings at once
+    using the memory mapped symmetric delete algorithm.
+
+    All strings and their deletion variants are resolved with a single
+    mmap_bulk_search against the deletion dictionary and the word list
+    respectively instead of one binary search per variant. Hashed deletion
+    dictionaries are queried directly.
+
+    Args:
+        ustrs (iterable): Unicode strings to generate suggestions for.
+        del_dic_path (unicode): Path to the deletion dictionary.
+        dic_path (unicode): Path to the dictionary of correct words or a
+                            container of correct words.
+        depth (int): Number of deletions to search for.
+
+    Returns:
+        A dictionary mapping each string to a dictionary of the form
+        returned by mapped_sym_suggest.
+    """
+    variants = {ustr: list(deletion_variants(ustr, depth)) for ustr in ustrs}
+    all_dels = set(itertools.chain.from_iterable(variants.itervalues()))
+    if is_hashed_del_dict(del_dic_path):
+        def del_lookup(s):
+            return hashed_del_dict_lookup(s, del_dic_path) or []
+    else:
+        del_entries = mmap_bulk_search(all_dels.union(variants), del_dic_path)
+
+        def del_lookup(s):
+            return parse_del_dict_entry(del_entries.get(s))
+    if isinstance(dic_path, basestring):
+        words = mmap_bulk_search(all_dels, dic_path,
+                                 entryparser_fn=key_for_single_word)
+    else:
+        words = dic_path
+    return {ustr: _sym_suggestions(ustr, dels, del_lookup,
+                                   words.__contains__, depth)
+            for ustr, dels in variants.iteritems()}
+
+
+def _sym_suggestions(ustr, dels, del_lookup, is_word, depth):
+    """
+    Classify the suggestions for ustr reachable through its deletion
+    variants dels. del_lookup returns the list of words of the deletion
+    dictionary entry of a string and is_word checks if a string is a
+    correct word.
     """
     deletes = set()
     inserts = set()
     int_and_dels = set()
     subs = set()
 
-    dels = strings_by_deletion(ustr, depth)
-    ustr_entry = mmap_bin_search(ustr, del_dic_path)
-    word_for_ustr = parse_del_dict_entry(ustr_entry)
+    word_for_ustr = del_lookup(ustr)
     if word_for_ustr is not None:
         # get the words reachable by adding to ustr.
         inserts = set(w for w in word_for_ustr)
     for s in dels:
-        if s in dic:
+        if is_word(s):
             deletes.add(s)  # Add a word reachable by deleting from ustr.
 
-        line_for_s = parse_del_dict_entry(mmap_bin_search(s, del_dic_path))
+        line_for_s = del_lookup(s)
         if line_for_s is not None:
             # Get the words reachable by deleting from originals, adding to
             # them. Note that this is NOT the same as 'Levenshtein'
             # substitution.
             for sug in line_for_s:
-                distance = edit_distance(sug, ustr)
+                distance = edit_distance(sug, ustr, max_distance=depth)
                 if distance == depth:
                     subs.add(sug)
                 elif distance > depth:
@@ -183,13 +369,102 @@ def key_for_single_word(entry):
     cleanword = entry.strip()
     return (cleanword, cleanword)
 
+# ----------------------------------------------------------------------
+# Memory mapped dictionary registry ------------------------------------
+# ----------------------------------------------------------------------
+
+# Maximum number of dictionaries kept mapped by a single process. The least
+# recently used map is closed when this limit is exceeded.
+max_mapped_dictionaries = 16
+
+# Maps absolute dictionary paths to tuples ((mtime, size, inode), mmap).
+_mapped_dictionaries = OrderedDict()
+
+
+def mapped_dictionary(dictionary_path, warm=False):
+    """
+    Return a read-only memory map of a dictionary file.
+
+    Maps are kept open in a process-wide registry keyed by the dictionary's
+    path and are transparently replaced when the modification time or size of
+    the file changes. When more than max_mapped_dictionaries are open the
+    least recently used one is closed.
+
+    Args:
+        dictionary_path (unicode): Path to the dictionary.
+        warm (bool): Advise the kernel that the whole file will be needed
+                     soon and fault in all its pages when the file is newly
+                     mapped.
+
+    Returns:
+        mmap.mmap: A read-only map of the whole dictionary file.
+    """
+    path = os.path.abspath(dictionary_path)
+    st = os.stat(path)
+    stamp = (st.st_mtime, st.st_size, st.st_ino)
+    entry = _mapped_dictionaries.pop(path, None)
+    if entry is not None:
+        if entry[0] == stamp:
+            _mapped_dictionaries[path] = entry
+            return entry[1]
+        entry[1].close()
+    with open(path, 'rb') as f:
+        # memory-map the file, size 0 means whole file
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if warm:
+        # madvise is only exposed by newer pythons
+        if hasattr(mm, 'madvise'):
+            mm.madvise(mmap.MADV_WILLNEED)
+        for offset in xrange(0, len(mm), mmap.PAGESIZE):
+            mm[offset]
+    _mapped_dictionaries[path] = (stamp, mm)
+    while len(_mapped_dictionaries) > max_mapped_dictionaries:
+        _mapped_dictionaries.popitem(last=False)[1][1].close()
+    return mm
+
+
+def close_mapped_dictionaries():
+    """
+    Close all dictionary maps held by the registry.
+    """
+    while _mapped_dictionaries:
+        _mapped_dictionaries.popitem()[1][1].close()
+
 # ----------------------------------------------------------------------
 # ----------------------------------------------------------------------
 # ----------------------------------------------------------------------
 
 
-# TODO Implement doubling-length backward search to make line_buffer_size
-# irrelevant.
+# Line offset indices are stored next to a dictionary as a sequence of
+# little-endian unsigned 64 bit integers, the byte offset of each line's start
+# followed by the size of the dictionary file.
+line_index_suffix = u'.idx'
+line_offset = struct.Struct(b'<Q')
+_line_span = struct.Struct(b'<QQ')
+
+
+def line_index_path(dictionary_path):
+    """
+    Return the path of the line offset index belonging to a dictionary.
+    """
+    return dictionary_path + line_index_suffix
+
+
+def mapped_line_index(dictionary_path, mm):
+    """
+    Return a read-only memory map of the line offset index of a dictionary
+    or None if the dictionary has no index or the index does not match the
+    mapped dictionary mm.
+    """
+    idx_path = line_index_path(dictionary_path)
+    if not os.path.isfile(idx_path):
+        return None
+    idx = mapped_dictionary(idx_path)
+    if len(idx) < line_offset.size or len(idx) % line_offset.size or \
+       line_offset.unpack_from(idx, len(idx) - line_offset.size)[0] != len(mm):
+        return None
+    return idx
+
 
 def mmap_bin_search(ustr, dictionary_path,
                     entryparser_fn=key_for_del_dict_entry,
@@ -199,15 +474,194 @@ def mmap_bin_search(ustr, dictionary_path,
     return the parsed entry, or None if the specified entry cannot be
     found. This function assumes that the dictionary is properly
     formatted and well-formed, otherwise the behavior is undefined.
-    Line buffer must not be shorter than the longest line in the
-    dictionary. Entries may be any strings which do not contain newlines
+    Entries may be any strings which do not contain newlines
     (newlines delimint entries); the entryparser_fn should be of the
     form fn_name(unicodestr), decorated with @unibarrier and return a
     tuple of the form (keytosort by, val). By default, it uses the
     function for parsing symmetric deletion dictionary entries.
-    The line_buffer_size argument must be >= the longest line in the
+    The dictionary map is obtained from the process-wide registry (see
+    mapped_dictionary).
+
+    If a line offset index (see line_index_path) exists next to the
+    dictionary the search bisects over line numbers and lines may be of
+    arbitrary length. Otherwise it bisects over byte offsets and the
+    line_buffer_size argument must be >= the longest line in the
     dictionary, or behavior is undefined.
     """
+    mm = mapped_dictionary(dictionary_path)
+    idx = mapped_line_index(dictionary_path, mm)
+    if idx is not None:
+        return _indexed_bin_search(ustr, mm, idx, entryparser_fn)
+    return _bytewise_bin_search(ustr, mm, entryparser_fn, line_buffer_size)
+
+
+def _indexed_bin_search(ustr, mm, idx, entryparser_fn):
+    """
+    Binary search over the line numbers of a dictionary using its line
+    offset index.
+    """
+    imin = 0
+    imax = len(idx) // line_offset.size - 1
+    while imin < imax:
+        mid = (imin + imax) // 2
+        start, end = _line_span.unpack_from(idx, mid * line_offset.size)
+        key, entry = entryparser_fn(mm[start:end].decode(u'utf-8'))
+
+        if key == ustr:
+            return entry
+        elif key < ustr:
+            imin = mid + 1
+        else:
+            imax = mid
+    return None
+
+
+def mmap_bulk_search(ustrs, dictionary_path,
+                     entryparser_fn=key_for_del_dict_entry):
+    """
+    Look up a collection of keys in a memory mapped dictionary.
+
+    The keys are sorted once and resolved in a single forward pass over the
+    dictionary's line offset index. Starting from the line of the previous
+    key the search gallops forward (doubling its step) and bisects the
+    remaining bracket, so closely spaced keys cost a handful of comparisons
+    each and the dictionary is only ever accessed in ascending order.
+    Dictionaries without a line offset index are searched key by key with
+    mmap_bin_search.
+
+    Args:
+        ustrs (iterable): Unicode strings to look up.
+        dictionary_path (unicode): Path to the dictionary.
+        entryparser_fn (function): Entry parser as used by mmap_bin_search.
+
+    Returns:
+        A dictionary mapping each key found in the dictionary to its parsed
+        entry. Keys not contained in the dictionary are omitted.
+    """
+    results = {}
+    keys = sorted(set(ustrs))
+    mm = mapped_dictionary(dictionary_path)
+    idx = mapped_line_index(dictionary_path, mm)
+    if idx is None:
+        for ustr in keys:
+            entry = mmap_bin_search(ustr, dictionary_path, entryparser_fn)
+            if entry is not None:
+                results[ustr] = entry
+        return results
+
+    return indexed_bulk_search(keys, mm, idx, entryparser_fn)
+
+
+def indexed_bulk_search(keys, mm, idx, entryparser_fn=key_for_del_dict_entry):
+    """
+    Look up a sorted sequence of keys in a dictionary that has already been
+    mapped into memory, e.g. one not managed by the dictionary registry.
+
+    Args:
+        keys (list): Unicode strings to look up in ascending order.
+        mm (mmap.mmap): Contents of the dictionary.
+        idx (str): Contents of the line offset index of the dictionary.
+        entryparser_fn (function): Entry parser as used by mmap_bin_search.
+
+    Returns:
+        A dictionary mapping each key found in the dictionary to its parsed
+        entry.
+    """
+    return {ustr: entry for ustr, _, entry in
+            _bulk_search_lines(keys, mm, idx, entryparser_fn)}
+
+
+def _bulk_search_lines(keys, mm, idx, entryparser_fn):
+    """
+    Yields a tuple (key, line number, entry) for each key of the sorted
+    sequence keys found in the dictionary mm with the line offset index idx.
+    """
+    def line_key(i):
+        start, end = _line_span.unpack_from(idx, i * line_offset.size)
+        return entryparser_fn(mm[start:end].decode(u'utf-8'))
+
+    lines = len(idx) // line_offset.size - 1
+    pos = 0
+    for ustr in keys:
+        # lines before lo are smaller than ustr, the first line not smaller
+        # than ustr is in [lo, hi].
+        lo = hi = pos
+        step = 1
+        while hi < lines and line_key(hi)[0] < ustr:
+            lo = hi + 1
+            hi += step
+            step *= 2
+        hi = min(hi, lines)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if line_key(mid)[0] < ustr:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo
+        if pos >= lines:
+            break
+        key, entry = line_key(pos)
+        if key == ustr:
+            yield ustr, pos, entry
+
+
+# Corpus frequencies of the words of a dictionary are stored in a sidecar
+# file next to it containing a little-endian uint32 for each line.
+frequency_column_suffix = u'.freq'
+frequency_entry = struct.Struct(b'<I')
+
+
+def frequency_column_path(dictionary_path):
+    """
+    Returns the path of the frequency column belonging to a dictionary.
+    """
+    return dictionary_path + frequency_column_suffix
+
+
+def mmap_bulk_frequencies(ustrs, dictionary_path):
+    """
+    Look up the corpus frequencies of a collection of words in the memory
+    mapped frequency column of a dictionary.
+
+    The words are located with the same single pass over the line offset
+    index as mmap_bulk_search and their frequencies read from the mapped
+    column, so no frequency table has to be loaded into memory.
+
+    Args:
+        ustrs (iterable): Unicode strings to look up.
+        dictionary_path (unicode): Path to the dictionary.
+
+    Returns:
+        A dictionary mapping each word found in the dictionary to its
+        frequency. It is empty if the dictionary has no line offset index or
+        frequency column.
+    """
+    freq_path = frequency_column_path(dictionary_path)
+    if not os.path.isfile(freq_path):
+        return {}
+    mm = mapped_dictionary(dictionary_path)
+    idx = mapped_line_index(dictionary_path, mm)
+    if idx is None:
+        return {}
+    freqs = mapped_dictionary(freq_path)
+    lines = len(idx) // line_offset.size - 1
+    if len(freqs) != lines * frequency_entry.size:
+        return {}
+    return {ustr: frequency_entry.unpack_from(freqs, pos *
+                                              frequency_entry.size)[0]
+            for ustr, pos, _ in _bulk_search_lines(sorted(set(ustrs)), mm, idx,
+                                                   key_for_single_word)}
+
+
+# TODO Implement doubling-length backward search to make line_buffer_size
+# irrelevant.
+
+def _bytewise_bin_search(ustr, mm, entryparser_fn, line_buffer_size):
+    """
+    Binary search over the byte offsets of a dictionary without a line
+    offset index.
+    """
 
     def current_entry(mm):
         start = mm.tell()
@@ -215,29 +669,111 @@ def mmap_bin_search(ustr, dictionary_path,
         mm.seek(start)
         return entryparser_fn(rawline.decode(u'utf-8'))
 
-    with codecs.open(dictionary_path, 'r+b') as f:
-        # memory-map the file, size 0 means whole file
-        mm = mmap.mmap(f.fileno(), 0)
-        imin = 0
-        imax = mm.size()
-        count = 0
-        while True:
-            mid = imin + int(math.floor((imax - imin) / 2))
-            mm.seek(mid)
-            mm.seek(prev_newline(mm))
-            key, entry = current_entry(mm)
-
-            if key == ustr:
-                return entry
-            elif key < ustr:
-                imin = mid + 1
-            else:
-                imax = mid - 1
+    imin = 0
+    imax = mm.size()
+    count = 0
+    while True:
+        mid = imin + int(math.floor((imax - imin) / 2))
+        mm.seek(mid)
+        mm.seek(prev_newline(mm, line_buffer_size))
+        key, entry = current_entry(mm)
+
+        if key == ustr:
+            return entry
+        elif key < ustr:
+            imin = mid + 1
+        else:
+            imax = mid - 1
+
+        count += 1
+        if imin >= imax:
+            break
+    return None
+
+# ----------------------------------------------------------------------
+# Hashed deletion dictionaries -----------------------------------------
+# ----------------------------------------------------------------------
+
+# A hashed deletion dictionary is a compiled, memory mappable form of a
+# symmetric deletion dictionary. Variants are identified by a 64 bit
+# fingerprint of their UTF-8 encoding (see del_dict_fingerprint) and words by
+# their index in the word table. All integers are little-endian. The file
+# consists of:
+#
+#   header        magic, version, number of buckets (a power of two), number
+#                 of variants, number of words, and the offsets of the
+#                 following sections.
+#   buckets       (buckets + 1) uint32 indices into the fingerprint table.
+#                 Bucket b contains the variants buckets[b]:buckets[b+1],
+#                 i.e. all variants whose fingerprint & (buckets - 1) == b.
+#   fingerprints  one uint64 fingerprint per variant.
+#   postings idx  one uint32 per variant, the offset of its postings in
+#                 units of 4 bytes. Variants derived from a single word
+#                 have no postings; instead the highest bit is set and the
+#                 remaining bits contain the word's id.
+#   postings      uint32 number of words followed by their uint32 ids.
+#   words         (words + 1) uint64 offsets of UTF-8 encoded words, relative
+#                 to the end of the offset table, followed by the words.
+hashed_del_dict_magic = b'NDHD'
+hashed_del_dict_header = struct.Struct(b'<4sIQQQQQQQQ')
+hashed_del_dict_inline = 0x80000000
+_uint32 = struct.Struct(b'<I')
+
+
+def del_dict_fingerprint(key):
+    """
+    Return the 64 bit fingerprint of an UTF-8 encoded variant in a hashed
+    deletion dictionary.
+    """
+    return line_offset.unpack_from(hashlib.md5(key).digest())[0]
+
 
-            count += 1
-            if imin >= imax:
-                break
+def is_hashed_del_dict(dictionary_path):
+    """
+    Check if a file is a hashed deletion dictionary.
+    """
+    mm = mapped_dictionary(dictionary_path)
+    return mm[:len(hashed_del_dict_magic)] == hashed_del_dict_magic
+
+
+def hashed_del_dict_lookup(ustr, dictionary_path):
+    """
+    Look up a variant in a hashed deletion dictionary.
+
+    Args:
+        ustr (unicode): The variant to look up.
+        dictionary_path (unicode): Path to the hashed deletion dictionary.
+
+    Returns:
+        A list of the words the variant can be derived from or None if the
+        variant is not contained in the dictionary.
+    """
+    mm = mapped_dictionary(dictionary_path)
+    (_, _, buckets, _, nwords, buckets_off, fps_off, postings_idx_off,
+     postings_off, words_off) = hashed_del_dict_header.unpack_from(mm, 0)
+    fp = del_dict_fingerprint(ustr.encode(u'utf-8'))
+    start, end = struct.unpack_from(b'<2I', mm,
+                                    buckets_off + 4 * (fp & (buckets - 1)))
+    fps = struct.unpack_from(b'<{}Q'.format(end - start), mm,
+                             fps_off + 8 * start)
+    if fp not in fps:
         return None
+    pos = _uint32.unpack_from(mm, postings_idx_off +
+                              4 * (start + fps.index(fp)))[0]
+    if pos & hashed_del_dict_inline:
+        ids = (pos & ~hashed_del_dict_inline,)
+    else:
+        pos = postings_off + 4 * pos
+        cnt = _uint32.unpack_from(mm, pos)[0]
+        ids = struct.unpack_from(b'<{}I'.format(cnt), mm, pos + 4)
+    base = words_off + line_offset.size * (nwords + 1)
+    words = []
+    for word_id in ids:
+        wstart, wend = _line_span.unpack_from(mm, words_off +
+                                              line_offset.size * word_id)
+        words.append(mm[base + wstart:base + wend].decode(u'utf-8'))
+    return words
+
 
 # ----------------------------------------------------------------------
 # ----------------------------------------------------------------------
@@ -345,16 +881,193 @@ def native_full_edit_distance(str1, str2, substitutionscore=1, insertscore=1,
 
 def edit_distance(str1, str2, substitutionscore=1, insertscore=1,
                   deletescore=1, charmatrix={},
-                  alignment_type='global'):
+                  alignment_type='global', max_distance=None):
+    """
+    Calculate the edit distance of two strings.
+
+    If max_distance is given any distance larger than it is reported as
+    max_distance + 1. Global distances without a charmatrix are then
+    calculated with banded_edit_distance.
+
+    Plain Levenshtein distances, i.e. global distances with unit costs and no
+    charmatrix, are always calculated with myers_edit_distance.
+    """
+    if not charmatrix and alignment_type == 'global' and \
+       substitutionscore == insertscore == deletescore == 1:
+        return myers_edit_distance(str1, str2, max_distance)
+    if max_distance is not None and not charmatrix and \
+       alignment_type == 'global':
+        return banded_edit_distance(str1, str2, max_distance,
+                                    substitutionscore=substitutionscore,
+                                    insertscore=insertscore,
+                                    deletescore=deletescore)
     m = native_full_edit_distance(str1, str2,
                                   substitutionscore=substitutionscore,
                                   insertscore=insertscore,
                                   deletescore=deletescore,
                                   charmatrix=charmatrix,
                                   alignment_type=alignment_type)[0]
+    if max_distance is not None:
+        return min(m[-1][-1], max_distance + 1)
     return m[-1][-1]
 
 
+def edit_distances(ustr, candidates, substitutionscore=1, insertscore=1,
+                   deletescore=1, charmatrix={}, alignment_type='global',
+                   max_distance=None):
+    """
+    Calculate the edit distances of a string to each of a sequence of
+    candidates.
+
+    For plain Levenshtein distances the bitmasks of ustr used by the Myers
+    kernel are only calculated once and shared by all candidates; all other
+    distances are calculated with edit_distance.
+
+    Args:
+        ustr (unicode): Query string
+        candidates (iterable): Strings to compare ustr against
+        max_distance (int): Optional threshold (see edit_distance).
+
+    Returns:
+        A list containing the edit distance of ustr to each candidate in
+        order.
+    """
+    if not charmatrix and alignment_type == 'global' and \
+       substitutionscore == insertscore == deletescore == 1:
+        pattern = _myers_pattern(ustr)
+        return [_myers_distance(pattern, cand, max_distance) for cand in
+                candidates]
+    return [edit_distance(ustr, cand, substitutionscore=substitutionscore,
+                          insertscore=insertscore, deletescore=deletescore,
+                          charmatrix=charmatrix,
+                          alignment_type=alignment_type,
+                          max_distance=max_distance) for cand in candidates]
+
+
+def myers_edit_distance(str1, str2, max_distance=None):
+    """
+    Calculate the Levenshtein distance of two strings with the bit-parallel
+    algorithm of Myers in the formulation of Hyyrö.
+
+    The vertical differences of a whole column of the DP matrix are encoded
+    in the bits of two integers which are updated with a constant number of
+    bit operations per character of the longer string.
+
+    Args:
+        str1 (unicode): First string
+        str2 (unicode): Second string
+        max_distance (int): Optional threshold. Distances larger than it are
+                            reported as max_distance + 1.
+
+    Returns:
+        The edit distance of the two strings.
+    """
+    if len(str1) > len(str2):
+        str1, str2 = str2, str1
+    return _myers_distance(_myers_pattern(str1), str2, max_distance)
+
+
+def _myers_pattern(pattern):
+    """
+    Precalculates the match bitmasks of a pattern for _myers_distance.
+    """
+    peq = {}
+    bit = 1
+    for c in pattern:
+        peq[c] = peq.get(c, 0) | bit
+        bit <<= 1
+    return peq, len(pattern)
+
+
+def _myers_distance(pattern, text, max_distance=None):
+    """
+    Calculates the Levenshtein distance between a pattern precalculated by
+    _myers_pattern and a text.
+    """
+    peq, m = pattern
+    if max_distance is not None and abs(m - len(text)) > max_distance:
+        return max_distance + 1
+    if not m:
+        return len(text)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    remaining = len(text)
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # the first row of the global distance matrix increases by one
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        remaining -= 1
+        # the score decreases by at most one per remaining character
+        if max_distance is not None and score - remaining > max_distance:
+            return max_distance + 1
+    if max_distance is not None:
+        return min(score, max_distance + 1)
+    return score
+
+
+def banded_edit_distance(str1, str2, max_distance, substitutionscore=1,
+                         insertscore=1, deletescore=1):
+    """
+    Calculate the global edit distance of two strings up to a threshold.
+
+    As every insertion and deletion moves an alignment one diagonal away from
+    the main diagonal only cells within max_distance / min(insertscore,
+    deletescore) diagonals of it are calculated, using a single row instead of
+    a full matrix. The calculation stops as soon as all cells of a row exceed
+    the threshold.
+
+    Returns:
+        The edit distance or max_distance + 1 if it is larger than
+        max_distance.
+    """
+    over = max_distance + 1
+    width = int(max_distance // min(insertscore, deletescore))
+    if abs(len(str1) - len(str2)) > width:
+        return over
+    # cells outside the band are never written and stay at over
+    row = [j * insertscore if j <= width else over for j in
+           xrange(len(str2) + 1)]
+    for i in xrange(1, len(str1) + 1):
+        lo = max(1, i - width)
+        hi = min(len(str2), i + width)
+        diag = row[lo - 1]
+        if lo == 1:
+            left = i * deletescore
+        else:
+            left = over
+        row[lo - 1] = left
+        row_min = left
+        c1 = str1[i - 1]
+        for j in xrange(lo, hi + 1):
+            up = row[j]
+            if c1 == str2[j - 1]:
+                val = diag
+            else:
+                val = min(diag + substitutionscore, left + insertscore,
+                          up + deletescore)
+            diag = up
+            row[j] = left = val
+            if val < row_min:
+                row_min = val
+        if row_min > max_distance:
+            return over
+    return min(row[-1], over)
+
+
 def full_edit_distance(str1, str2, substitutionscore=1, insertscore=1,
                        deletescore=1, ins_func=None, iargs=[], ikwargs={},
                        del_func=None, dargs=[], dkwargs={}, sub_func=None,
@@ -411,11 +1124,227 @@ def full_edit_distance(str1, str2, substitutionscore=1, insertscore=1,
 
     return matrix, steps
 
+# ----------------------------------------------------------------------
+# Linear memory alignment ----------------------------------------------
+# ----------------------------------------------------------------------
+
+# Subproblems with at most this many matrix cells are aligned with a full
+# matrix instead of being split further.
+hirschberg_cutoff = 4096
+
+
+def hirschberg_align(str1, str2, substitutionscore=1, insertscore=1,
+                     deletescore=1):
+    """
+    Find a minimal cost global alignment of two sequences in linear memory.
+
+    The divide and conquer algorithm of Hirschberg splits str1 in half and
+    finds the position in str2 where an optimal alignment crosses the split
+    using the last rows of the score matrices of the first half and the
+    reversed second half. Both halves are then aligned recursively. Only two
+    matrix rows are kept at any time, doubling the running time of the
+    Wagner-Fischer algorithm but making it possible to align page-length
+    texts.
+
+    Args:
+        str1 (sequence): First sequence
+        str2 (sequence): Second sequence
+
+    Returns:
+        A list of edit operations ('m', 's', 'i', 'd') transforming str1 into
+        str2. Optimal alignments with the same cost may differ from the ones
+        found by native_align.
+    """
+    scores = (substitutionscore, insertscore, deletescore)
+    path = []
+    stack = [(str1, str2)]
+    while stack:
+        a, b = stack.pop()
+        if len(a) <= 1 or (len(a) + 1) * (len(b) + 1) <= hirschberg_cutoff:
+            path.extend(_full_alignment(a, b, *scores))
+            continue
+        mid = len(a) // 2
+        left = _alignment_row(a[:mid], b, *scores)
+        right = _alignment_row(a[mid:][::-1], b[::-1], *scores)
+        split = min(xrange(len(b) + 1),
+                    key=lambda j: left[j] + right[len(b) - j])
+        # the stack is processed last in first out
+        stack.append((a[mid:], b[split:]))
+        stack.append((a[:mid], b[:split]))
+    return path
+
+
+def hirschberg_semi_global_align(shortseq, longseq, substitutionscore=1,
+                                 insertscore=1, deletescore=1):
+    """
+    Find a semi-global alignment of two sequences in linear memory.
+
+    Insertions before and after the aligned part of longseq are free. The end
+    of the aligned part is found with a forward pass over the score matrix,
+    its start with a backward pass, and the part in between is aligned with
+    hirschberg_align.
+
+    Returns:
+        A list of edit operations like native_semi_global_align, i.e. the
+        leading insertions are included and trailing ones are not.
+    """
+    if len(shortseq) > len(longseq):
+        raise NidabaAlgorithmException('shortseq must be <= longseq in\
+                                       length!')
+    scores = (substitutionscore, insertscore, deletescore)
+    last = _alignment_row(shortseq, longseq, *scores, free_start=True)
+    end = last.index(min(last))
+    first = _alignment_row(shortseq[::-1], longseq[:end][::-1], *scores,
+                           free_start=True)
+    start = end - first.index(min(first))
+    return ['i'] * start + hirschberg_align(shortseq, longseq[start:end],
+                                            *scores)
+
+
+def anchored_align(str1, str2, k=8, substitutionscore=1, insertscore=1,
+                   deletescore=1):
+    """
+    Quickly align two long, mostly identical sequences such as an OCR
+    result and its ground truth.
+
+    All k-grams occurring exactly once in both sequences are used as
+    candidate anchors. The longest chain of anchors appearing in the same
+    order in both sequences is selected with patience sorting, each anchor is
+    extended into a run of matches, and only the gaps between those runs are
+    aligned with hirschberg_align. For typical OCR output this reduces the
+    quadratic alignment to almost linear work. The resulting edit script is
+    not guaranteed to be minimal if the anchors are misplaced, e.g. in highly
+    repetitive text.
+
+    Args:
+        str1 (sequence): First sequence
+        str2 (sequence): Second sequence
+        k (int): Length of anchor k-grams
+
+    Returns:
+        A list of edit operations ('m', 's', 'i', 'd') transforming str1 into
+        str2.
+    """
+    scores = (substitutionscore, insertscore, deletescore)
+    path = []
+    i = j = 0
+    for a1, a2 in _alignment_anchors(str1, str2, k):
+        # anchors overlapping an already extended run are skipped
+        if a1 < i or a2 < j:
+            continue
+        path.extend(hirschberg_align(str1[i:a1], str2[j:a2], *scores))
+        i, j = a1, a2
+        while i < len(str1) and j < len(str2) and str1[i] == str2[j]:
+            path.append('m')
+            i += 1
+            j += 1
+    path.extend(hirschberg_align(str1[i:], str2[j:], *scores))
+    return path
+
+
+def _alignment_anchors(str1, str2, k):
+    """
+    Returns the positions (i, j) of the longest increasing chain of k-grams
+    unique in both sequences.
+    """
+    def unique_kgrams(seq):
+        pos = {}
+        for i in xrange(len(seq) - k + 1):
+            gram = tuple(seq[i:i + k])
+            pos[gram] = None if gram in pos else i
+        return pos
+
+    grams2 = unique_kgrams(str2)
+    pairs = sorted((i, grams2[gram]) for gram, i in
+                   unique_kgrams(str1).iteritems() if i is not None and
+                   grams2.get(gram) is not None)
+    # patience sorting of the positions in str2
+    tails = []
+    tail_idx = []
+    prev = [None] * len(pairs)
+    for idx, (_, j) in enumerate(pairs):
+        pile = bisect.bisect_left(tails, j)
+        if pile:
+            prev[idx] = tail_idx[pile - 1]
+        if pile == len(tails):
+            tails.append(j)
+            tail_idx.append(idx)
+        else:
+            tails[pile] = j
+            tail_idx[pile] = idx
+    chain = []
+    idx = tail_idx[-1] if tail_idx else None
+    while idx is not None:
+        chain.append(pairs[idx])
+        idx = prev[idx]
+    chain.reverse()
+    return chain
+
+
+def _alignment_row(a, b, substitutionscore, insertscore, deletescore,
+                   free_start=False):
+    """
+    Returns the last row of the global (or semi-global if free_start is set)
+    alignment score matrix of a and b.
+    """
+    if free_start:
+        prev = [0] * (len(b) + 1)
+    else:
+        prev = [j * insertscore for j in xrange(len(b) + 1)]
+    for i, c1 in enumerate(a, 1):
+        cur = [i * deletescore]
+        for j, c2 in enumerate(b, 1):
+            sub = prev[j - 1] if c1 == c2 else prev[j - 1] + substitutionscore
+            cur.append(min(sub, cur[j - 1] + insertscore,
+                           prev[j] + deletescore))
+        prev = cur
+    return prev
+
+
+def _full_alignment(a, b, substitutionscore, insertscore, deletescore):
+    """
+    Aligns two short sequences with a full score matrix.
+    """
+    matrix = [[j * insertscore for j in xrange(len(b) + 1)]]
+    steps = [['i'] * (len(b) + 1)]
+    for i, c1 in enumerate(a, 1):
+        row = [i * deletescore]
+        step = ['d']
+        prev = matrix[-1]
+        for j, c2 in enumerate(b, 1):
+            if c1 == c2:
+                options = (('m', prev[j - 1]),)
+            else:
+                options = (('s', prev[j - 1] + substitutionscore),)
+            options += (('i', row[j - 1] + insertscore),
+                        ('d', prev[j] + deletescore))
+            op, score = min(options, key=operator.itemgetter(1))
+            row.append(score)
+            step.append(op)
+        matrix.append(row)
+        steps.append(step)
+    path = []
+    i, j = len(a), len(b)
+    while i or j:
+        op = steps[i][j]
+        path.append(op)
+        if op != 'i':
+            i -= 1
+        if op != 'd':
+            j -= 1
+    path.reverse()
+    return path
+
 # ----------------------------------------------------------------------
 # String and alignment algorithms (numpy versions) ---------------------
 # ----------------------------------------------------------------------
 
 
+# Edit operations of the uint8 step matrices of np_full_edit_distance
+np_step_codes = ('', 'm', 's', 'i', 'd')
+_np_step_moves = ((0, 0), (-1, -1), (-1, -1), (0, -1), (-1, 0))
+
+
 def np_backtrace(matrix, start=None):
     """Trace edit steps backward to find an edit sequence for an
     alignment. Starts at the provided 'start' index, or in the i,j'th
@@ -424,13 +1353,15 @@ def np_backtrace(matrix, start=None):
 
     i, j = start if start is not None else (
         matrix.shape[0] - 1, matrix.shape[1] - 1)
-    key = {'i': (0, -1), 'd': (-1, 0), 'm': (-1, -1), 's': (-1, -1)}
     path = []
 
-    while matrix[i, j] != '':
-        path.insert(0, matrix[i, j])
-        i, j = tuple(map(operator.add, (i, j), key[matrix[i, j]]))
-
+    op = matrix[i, j]
+    while op:
+        path.append(np_step_codes[op])
+        i += _np_step_moves[op][0]
+        j += _np_step_moves[op][1]
+        op = matrix[i, j]
+    path.reverse()
     return path
 
 
@@ -496,38 +1427,72 @@ def np_full_edit_distance(str1, str2, substitutionscore=1, insertscore=1,
     "edit_distance" function, this returns the entire scoring matrix,
     and an operation matrix for backtracing and reconstructing the
     edit operations. This should be used when an alignment is desired,
-    not only the edit distance."""
-
+    not only the edit distance.
+
+    The sequences are encoded as integer arrays and the matrix is filled one
+    anti-diagonal at a time as all cells on it only depend on the two
+    preceding anti-diagonals. The operation matrix is an uint8 array
+    containing indices into np_step_codes."""
+
+    codes = {}
+    enc1 = numpy.array([codes.setdefault(c, len(codes)) for c in str1],
+                       dtype=numpy.int64)
+    enc2 = numpy.array([codes.setdefault(c, len(codes)) for c in str2],
+                       dtype=numpy.int64)
     str1 = numpy.array(tuple(str1))
     str2 = numpy.array(tuple(str2))
+    rows, cols = str1.size, str2.size
 
     types = {'global': np_global_matrix, 'semi-global': np_semi_global_matrix}
     matrix = types[alignment_type](str1, str2, substitutionscore,
                                    insertscore, deletescore, charmatrix)
 
-    steps = numpy.empty(
-        shape=(str1.size + 1, str2.size + 1), dtype=numpy.object)
-    steps[1:, 0] = 'd'
-    steps[0, 1:] = 'i'
-    steps[0, 0] = ''
-    for i in xrange(1, matrix.shape[0]):
-        for j in xrange(1, matrix.shape[1]):
-            c1 = str1[i - 1]
-            c2 = str2[j - 1]
-
-            scores = (('s', matrix[i - 1, j - 1] + charmatrix.get((c1, c2),
-                                                                  substitutionscore)),
-                      ('i', matrix[i, j - 1] + charmatrix.get((c1, c2),
-                                                              insertscore)),
-                      ('d', matrix[i - 1, j] + charmatrix.get((c1, c2),
-                                                              deletescore)))
-            if str1[i - 1] == str2[j - 1]:
-                matrix[i, j] = matrix[i - 1, j - 1]
-                steps[i, j] = 'm'
-            else:
-                bestoption = min(scores, key=lambda x: x[1])
-                matrix[i, j] = bestoption[1]
-                steps[i, j] = bestoption[0]
+    steps = numpy.zeros(shape=(rows + 1, cols + 1), dtype=numpy.uint8)
+    steps[1:, 0] = np_step_codes.index('d')
+    steps[0, 1:] = np_step_codes.index('i')
+    if not rows or not cols:
+        return matrix, steps
+
+    eq = (enc1[:, None] == enc2[None, :]).ravel()
+    if charmatrix:
+        # charmatrix overrides all three operations of a character pair
+        scores = numpy.empty((3, rows, cols))
+        scores[0] = substitutionscore
+        scores[1] = insertscore
+        scores[2] = deletescore
+        for (c1, c2), score in charmatrix.iteritems():
+            if c1 in codes and c2 in codes:
+                scores[:, (enc1 == codes[c1])[:, None] &
+                       (enc2 == codes[c2])[None, :]] = score
+        scores = scores.reshape(3, -1)
+    else:
+        scores = None
+
+    width = cols + 1
+    flat_matrix = matrix.reshape(-1)
+    flat_steps = steps.reshape(-1)
+    for diag in xrange(2, rows + cols + 1):
+        i = numpy.arange(max(1, diag - cols), min(rows, diag - 1) + 1)
+        idx = i * width + diag - i
+        # index of the character pair in the (rows, cols) arrays
+        pair = idx - width - i
+        options = numpy.vstack((flat_matrix[idx - width - 1],
+                                flat_matrix[idx - 1],
+                                flat_matrix[idx - width]))
+        if scores is None:
+            options += numpy.array([[substitutionscore], [insertscore],
+                                    [deletescore]])
+        else:
+            options += scores[:, pair]
+        # argmin returns the first minimum, preferring s over i over d
+        best = numpy.argmin(options, axis=0)
+        values = options[best, numpy.arange(i.size)]
+        ops = best.astype(numpy.uint8) + 2
+        match = eq[pair]
+        values[match] = flat_matrix[idx[match] - width - 1]
+        ops[match] = 1
+        flat_matrix[idx] = values
+        flat_steps[idx] = ops
 
     return matrix, steps
 
@@ -572,6 +1537,108 @@ def inblock(c, bounds):
     return ord(c) >= ord(bounds[0]) and ord(c) <= ord(bounds[1])
 
 
+_narrow_build = sys.maxunicode == 0xFFFF
+
+
+def _as_unicode(string):
+    """
+    Converts byte strings to unicode, mapping each byte to the code point of
+    the same value like ord() does.
+    """
+    if isinstance(string, bytes):
+        return string.decode('latin-1')
+    return string
+
+
+class UnicodeBlockClassifier(object):
+    """
+    A precompiled classifier mapping code points to user defined unicode
+    blocks.
+
+    The bounds of all blocks are merged into a sorted array of elementary
+    intervals, each covered by a fixed set of blocks. A code point is
+    classified by a binary search over the interval bounds; whole strings
+    are classified at once with numpy.
+
+    Args:
+        unicode_blocks (iterable): 3-tuples of the form (<name of block>,
+                                   <first unichar in block>, <last unichar in
+                                   the block>).
+    """
+    def __init__(self, unicode_blocks):
+        blocks = [(b[0], ord(b[1]), ord(b[2])) for b in unicode_blocks]
+        self.names = []
+        for name, _, _ in blocks:
+            if name not in self.names:
+                self.names.append(name)
+        bounds = sorted(set([0] + [b[1] for b in blocks] +
+                            [b[2] + 1 for b in blocks]))
+        self.bounds = numpy.array(bounds, dtype=numpy.int64)
+        # number of times each interval is covered by each named block
+        self.coverage = numpy.zeros((len(bounds), len(self.names)),
+                                    dtype=numpy.int64)
+        for name, first, last in blocks:
+            lo = bisect.bisect_left(bounds, first)
+            hi = bisect.bisect_left(bounds, last + 1)
+            self.coverage[lo:hi, self.names.index(name)] += 1
+
+    def classify(self, c):
+        """
+        Returns the names of the blocks containing the character c.
+        """
+        row = self.coverage[bisect.bisect_right(self.bounds, ord(c)) - 1]
+        return [name for name, cnt in zip(self.names, row) if cnt]
+
+    def _intervals(self, string):
+        # one value per element of the unicode object like ord(), i.e. per
+        # UTF-16 code unit on narrow builds
+        if _narrow_build:
+            cps = numpy.frombuffer(string.encode('utf-16-le'), dtype='<u2')
+        else:
+            cps = numpy.frombuffer(string.encode('utf-32-le'), dtype='<u4')
+        return numpy.searchsorted(self.bounds, cps, side='right') - 1
+
+    def identify(self, string):
+        """
+        Counts the characters of a string in each block (see identify).
+        """
+        hist = numpy.bincount(self._intervals(_as_unicode(string)),
+                              minlength=len(self.bounds))
+        return dict(zip(self.names, hist.dot(self.coverage).tolist()))
+
+    def identify_many(self, strings):
+        """
+        Counts the characters of each of a sequence of strings in each block
+        with a single pass over their concatenation.
+
+        Returns:
+            A list containing a dictionary like identify for each string.
+        """
+        strings = [_as_unicode(x) for x in strings]
+        if not strings:
+            return []
+        lengths = [len(x) for x in strings]
+        ids = numpy.repeat(numpy.arange(len(strings)), lengths)
+        hist = numpy.bincount(ids * len(self.bounds) +
+                              self._intervals(''.join(strings)),
+                              minlength=len(strings) * len(self.bounds))
+        counts = hist.reshape(len(strings), -1).dot(self.coverage).tolist()
+        return [dict(zip(self.names, row)) for row in counts]
+
+
+_block_classifiers = {}
+
+
+def block_classifier(unicode_blocks):
+    """
+    Returns a cached UnicodeBlockClassifier for a list of unicode blocks.
+    """
+    key = tuple((b[0], b[1], b[2]) for b in unicode_blocks)
+    if key not in _block_classifiers:
+        _block_classifiers[key] = UnicodeBlockClassifier(key)
+    return _block_classifiers[key]
+
+
 def identify(string, unicode_blocks):
     """
     Determine percent-wise how many characters in the given string
@@ -581,12 +1648,55 @@ def identify(string, unicode_blocks):
     (<name of block>, <first unichar in block>, <last unichar in the
     block>).
     """
-    result = {b[0]: 0 for b in unicode_blocks}
-    for c in string:
-        for r in unicode_blocks:
-            if inblock(c, (r[1], r[2])):
-                result[r[0]] += 1
+    return block_classifier(unicode_blocks).identify(string)
+
+
+def identify_many(strings, unicode_blocks):
+    """
+    Calls identify on each of a sequence of strings, e.g. all segments of
+    an OCR record, at once.
+    """
+    return block_classifier(unicode_blocks).identify_many(strings)
+
+
+# Unicode blocks of the scripts distinguished by identify_scripts. All blocks
+# of a script share its name so identify adds up their counts.
+scripts = {u'greek': [(u'greek', u'\u0370', u'\u03FF'),
+                      (u'greek', u'\u1F00', u'\u1FFF')],
+           u'latin': [(u'latin', u'A', u'Z'),
+                      (u'latin', u'a', u'z'),
+                      (u'latin', u'\u00C0', u'\u024F'),
+                      (u'latin', u'\u1E00', u'\u1EFF')]}
+
+
+def identify_scripts(strings, names=None, threshold=0.5):
+    """
+    Determines the script of each of a sequence of strings.
+
+    Characters not belonging to any of the scripts, e.g. punctuation, digits,
+    and combining diacritics, are ignored.
+
+    Args:
+        strings (iterable): Unicode strings to classify.
+        names (list): Names of scripts in the scripts dictionary to choose
+                      from. All known scripts are used if none are given.
+        threshold (float): Minimal fraction of the classified characters of a
+                           string belonging to the predominant script.
 
+    Returns:
+        A list containing the name of the predominant script of each string
+        or None if it could not be determined.
+    """
+    names = sorted(scripts) if names is None else list(names)
+    blocks = [block for name in names for block in scripts[name]]
+    result = []
+    for counts in identify_many(strings, blocks):
+        total = sum(counts.itervalues())
+        best = max(names, key=counts.get)
+        if total and counts[best] >= threshold * total:
+            result.append(best)
+        else:
+            result.append(None)
     return result
 
 
@@ -627,11 +1737,28 @@ def greek_chars():
     return chars
 
 
+greek_char_set = frozenset(greek_chars())
+greek_diacritic_set = frozenset(uniblock(combining_diacritical_mark_range[1],
+                                         combining_diacritical_mark_range[2]) +
+                                greek_and_coptic_diacritics +
+                                extended_greek_diacritics)
+_strip_diacritics_table = {ord(c): None for c in greek_diacritic_set}
+
+
 def greek_filter(string):
     """
     Remove all non-Greek characters from a string.
     """
-    return filter(greek_chars().__contains__, string)
+    if isinstance(string, unicode):
+        return u''.join(c for c in string if c in greek_char_set)
+    return filter(greek_char_set.__contains__, string)
+
+
+def greek_filter_many(strings):
+    """
+    Calls greek_filter on each of an iterable of strings.
+    """
+    return [greek_filter(string) for string in strings]
 
 
 def strip_diacritics(ustr):
@@ -639,10 +1766,18 @@ def strip_diacritics(ustr):
     Remove all Greek diacritics from the specified string. Expects the
     string to be in NFD.
     """
-    diacritics = uniblock(combining_diacritical_mark_range[1],
-                          combining_diacritical_mark_range[2])
-    diacritics += greek_and_coptic_diacritics + extended_greek_diacritics
-    return u''.join(c for c in ustr if c not in diacritics)
+    if isinstance(ustr, unicode):
+        return ustr.translate(_strip_diacritics_table)
+    return u''.join(c for c in ustr if c not in greek_diacritic_set)
+
+
+def strip_diacritics_many(ustrs):
+    """
+    Calls strip_diacritics on each of an iterable of strings.
+    """
+    return [ustr.translate(_strip_diacritics_table)
+            if isinstance(ustr, unicode) else strip_diacritics(ustr)
+            for ustr in ustrs]
 
 
 def list_to_uni(l, encoding=u'utf-8'):
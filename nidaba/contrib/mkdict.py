@@ -3,31 +3,65 @@
 
 from __future__ import unicode_literals, print_function, absolute_import
 
+import os
 import click
 
 from nidaba import lex
 
 
 @click.command()
-@click.option('--input', help='Input text', type=click.Path(exists=True,
-              dir_okay=False), required=True)
+@click.option('--input', help='Input text or directory of input texts',
+              type=click.Path(exists=True), required=True)
 @click.option('--del_dict', help='Path to the output deletion dictionary',
               type=click.Path(writable=True, dir_okay=False), required=True)
 @click.option('--dictionary', help='Path to the output word list',
               type=click.Path(writable=True, dir_okay=False), required=True)
+@click.option('--dawg', help='Path to an additional DAWG word list',
+              type=click.Path(writable=True, dir_okay=False), default=None)
 @click.option('--depth', default=1, help='Maximum precalculated edit distance '
               'in deletion dictionary')
+@click.option('--memory', type=click.INT, default=None, help='Approximate '
+              'memory budget in MiB for building the deletion dictionary. '
+              'Variants exceeding it are sorted on disk.')
+@click.option('--tmpdir', type=click.Path(exists=True, file_okay=False,
+              writable=True), default=None, help='Directory for temporary '
+              'files created when a memory budget or multiple jobs are set')
+@click.option('--hashed', help='Path to an additional compiled hashed '
+              'deletion dictionary', type=click.Path(writable=True,
+              dir_okay=False), default=None)
+@click.option('--jobs', '-j', default=1, help='Number of processes used to '
+              'read the input and calculate the deletion dictionary')
 @click.version_option()
-def main(input, del_dict, dictionary, depth):
+def main(input, del_dict, dictionary, dawg, depth, memory, tmpdir, hashed, jobs):
     click.echo('Reading input file\t[', nl=False)
-    words = lex.cleanuniquewords(input)
+    if os.path.isdir(input):
+        freqs = lex.word_frequencies_from_files(input, jobs=jobs)
+    else:
+        freqs = lex.uniquewords_with_freq(input, jobs=jobs)
+    words = sorted(freqs)
     click.secho(u'\u2713', fg='green', nl=False)
     click.echo(']')
     click.echo('Writing dictionary\t[', nl=False)
-    lex.make_dict(dictionary, words)
+    lex.make_dict(dictionary, words, frequencies=freqs)
     click.secho(u'\u2713', fg='green', nl=False)
     click.echo(']')
+    if dawg:
+        click.echo('Writing DAWG\t\t[', nl=False)
+        lex.make_dawg(dawg, words)
+        click.secho(u'\u2713', fg='green', nl=False)
+        click.echo(']')
     click.echo('Writing deletions\t[', nl=False)
-    lex.make_deldict(del_dict, words, depth)
+    if memory or jobs > 1:
+        kwargs = {'tmpdir': tmpdir, 'jobs': jobs}
+        if memory:
+            kwargs['memory'] = memory
+        lex.make_deldict_external(del_dict, words, depth, **kwargs)
+    else:
+        lex.make_deldict(del_dict, words, depth)
     click.secho(u'\u2713', fg='green', nl=False)
     click.echo(']')
+    if hashed:
+        click.echo('Compiling deletions\t[', nl=False)
+        lex.make_hashed_deldict(hashed, del_dict)
+        click.secho(u'\u2713', fg='green', nl=False)
+        click.echo(']')
@@ -11,15 +11,89 @@ dictionaries, etc.
 from __future__ import unicode_literals, print_function, absolute_import
 
 import os
+import errno
 import codecs
 import glob
+import heapq
 import regex
+import tempfile
+import shutil
+import itertools
+import operator
+import mmap
+import array
+import numpy
+import struct
+import bisect
+import multiprocessing
+import hashlib
+import json
+import time
+import uuid
+import contextlib
 import nidaba.algorithms.string as alg
-from collections import Counter
+from collections import Counter, OrderedDict
+
+from nidaba.nidabaexceptions import NidabaAlgorithmException
+from nidaba.nidabaexceptions import NidabaInvalidParameterException
+
+# Rough estimate of the memory (in bytes) used by a single buffered (variant,
+# index, word) tuple in make_deldict_external including list overhead.
+_pair_size = 200
+
+# Maximum number of sorted runs merged at once.
+_merge_fan_in = 128
+
+# Size in bytes of the parts of corpus files read by a single worker process.
+_corpus_chunk_size = 32 * 2 ** 20
+
+# Default number of tokens kept by the in-process tier of a suggestion cache.
+suggestion_cache_size = 65536
+
+# Maximum number of suggestion caches (one per dictionary) kept by a process.
+max_suggestion_caches = 8
+
+# Minimal number of misspelled tokens checked by multiple processes.
+_spellcheck_shard_size = 512
+
+
+def tei_tag_scripts(facsimile, scripts=None, threshold=0.5, overwrite=False):
+    """
+    Sets the language of the segments of an OCR record to the script they
+    are written in.
+
+    The text of all segments is classified with a single call to
+    alg.identify_scripts.
+
+    Args:
+        facsimile (nidaba.tei.OCRRecord): OCR record object.
+        scripts (list): Names of scripts to choose from (see alg.scripts).
+        threshold (float): Minimal fraction of characters of a segment that
+                           have to belong to the predominant script.
+        overwrite (bool): Switch to replace languages already set, e.g. by
+                          the OCR engine.
+
+    Returns:
+        The OCRRecord object with tagged segments.
+    """
+    segments = [seg for seg in facsimile.segments.itervalues() if overwrite or
+                'language' not in seg]
+    if not segments:
+        return facsimile
+    texts = [''.join(x['grapheme'] for x in seg['content'].itervalues()) for
+             seg in segments]
+    for seg, script in zip(segments, alg.identify_scripts(texts, scripts,
+                                                          threshold)):
+        if script:
+            seg['language'] = script
+    return facsimile
 
 
 def tei_spellcheck(facsimile, dictionary, deletion_dictionary,
-                   filter_punctuation=False):
+                   filter_punctuation=False, depth=1, script=None,
+                   max_suggestions=None, cache=None,
+                   confidence_threshold=None,
+                   grapheme_confidence_threshold=None, jobs=1):
     """
     Performs a spell check on an TEI XML document.
 
@@ -27,47 +101,143 @@ def tei_spellcheck(facsimile, dictionary, deletion_dictionary,
     will be inserted using a choice tag. Correct words will be untouched and
     correction candidates will be sorted by edit distance.
 
+    Segments the OCR engine is confident about can be excluded from the spell
+    check. If confidence_threshold and/or grapheme_confidence_threshold are
+    given, a segment is skipped if its confidence and/or the confidence of
+    each of its graphemes reaches the respective threshold (see
+    is_confident_segment).
+
     Args:
         facsimile (nidaba.tei.OCRRecord): OCR record object.
         dictionary (unicode): Path to a base dictionary.
-        deletion_dictionary (unicode): Path to a deletion dictionary.
+        deletion_dictionary (unicode): Path to a deletion dictionary or None
+                                       to search the dictionary (which has
+                                       to be a DAWG) directly.
         filter_punctuation (bool): Switch to filter punctuation inside
                                    segments.
+        depth (int): Edit distance of suggestions.
+        script (unicode): Script of the dictionary. Segments tagged with
+                          another script by tei_tag_scripts are skipped.
+        max_suggestions (int): Maximum number of suggestions per segment.
+        cache (SuggestionCache): Cache of suggestions shared between
+                                 documents (see suggestion_cache).
+        confidence_threshold (float): Minimal confidence (0-100) of segments
+                                      that are skipped.
+        grapheme_confidence_threshold (float): Minimal confidence (0-100) of
+                                               all graphemes of segments
+                                               that are skipped.
+        jobs (int): Number of processes computing suggestions.
 
     Returns:
         A OCRRecord object containing the spelling corrections.
     """
-    text_tokens = set(''.join(y['grapheme'] for y in x.get('content').itervalues()) for x in facsimile.segments.itervalues())
-    text_tokens.remove('')
+    def _skip(segment):
+        lang = segment.get('language')
+        if script is not None and lang in alg.scripts and lang != script:
+            return True
+        return is_confident_segment(segment, confidence_threshold,
+                                    grapheme_confidence_threshold)
+
+    text_tokens = set(''.join(y['grapheme'] for y in x.get('content').itervalues()) for x in facsimile.segments.itervalues() if not _skip(x))
+    text_tokens.discard('')
     text_tokens = list(text_tokens)
     if filter_punctuation:
         text_tokens = [regex.sub('[^\w]', '', x) for x in text_tokens]
-    suggestions = spellcheck(text_tokens, dictionary, deletion_dictionary)
+    suggestions = spellcheck(text_tokens, dictionary, deletion_dictionary,
+                             depth, distances=True,
+                             max_suggestions=max_suggestions, cache=cache,
+                             jobs=jobs)
     facsimile.add_respstmt('spell-checker', 'nidaba-levenshtein')
     for seg_id, segment in facsimile.segments.iteritems():
-        key = alg.sanitize(''.join(x['grapheme'] for x in segment['content'].itervalues()))
+        if _skip(segment):
+            continue
+        key = alg.cached_sanitize(''.join(x['grapheme'] for x in segment['content'].itervalues()))
         if filter_punctuation:
             key = regex.sub('[^\w]', '', key)
         if key not in suggestions:
             continue
-        for sugg in suggestions[key]:
-            facsimile.add_choices(seg_id, [{'alternative': sugg, 'confidence': 100 - 10 * alg.edit_distance(key, sugg)}])
+        for sugg, dist in suggestions[key]:
+            facsimile.add_choices(seg_id, [{'alternative': sugg, 'confidence': 100 - 10 * dist}])
     return facsimile
 
 
-def spellcheck(tokens, dictionary, deletion_dictionary):
+def is_confident_segment(segment, confidence_threshold=None,
+                         grapheme_confidence_threshold=None):
+    """
+    Checks if the confidence of a segment and/or of each of its graphemes
+    reaches a threshold.
+
+    Segments and graphemes without a confidence value are never considered
+    confident. Neither are segments without graphemes, e.g. those of
+    word-level engines, if a grapheme threshold is given.
+
+    Args:
+        segment (dict): A segment of an OCRRecord.
+        confidence_threshold (float): Minimal confidence of the segment.
+        grapheme_confidence_threshold (float): Minimal confidence of all
+                                               graphemes of the segment.
+
+    Returns:
+        bool: True if at least one threshold is given and all given
+        thresholds are reached, False otherwise.
+    """
+    if confidence_threshold is None and grapheme_confidence_threshold is None:
+        return False
+    if confidence_threshold is not None and \
+       segment.get('confidence', -1) < confidence_threshold:
+        return False
+    if grapheme_confidence_threshold is not None:
+        graphemes = segment['content'].values()
+        return bool(graphemes) and all(g.get('confidence', -1) >=
+                                       grapheme_confidence_threshold for g in
+                                       graphemes)
+    return True
+
+
+def spellcheck(tokens, dictionary, deletion_dictionary, depth=1,
+               distances=False, max_suggestions=None, cache=None, jobs=1):
     """
     Performs a spell check on a sequence of tokens.
 
     The spelling of each sequence of characters is compared against a
     dictionary containing deletions of valid words and a dictionary of correct
-    words.
+    words. All tokens and their deletion variants are looked up at once in a
+    single forward pass over each dictionary.
+
+    Without a deletion dictionary the dictionary has to be a DAWG which is
+    searched for all words within the edit distance given by depth (see
+    levenshtein_suggest). This requires no precomputed variants and is
+    practical for depths larger than 1.
+
+    Suggestions with the same edit distance are ranked by their corpus
+    frequency, most frequent first, if the dictionary is a plain word list
+    with a frequency column (see make_dict). DAWG dictionaries have no line
+    numbers to address such a column and their suggestions are not ranked
+    by frequency.
+
+    If a cache is given, tokens checked by earlier calls are taken from it
+    and only the remaining ones are looked up in the dictionaries. The cache
+    has to be the one belonging to the dictionaries (see suggestion_cache).
+
+    With multiple jobs the tokens missing from the dictionary are split into
+    shards checked by a pool of processes if there are at least
+    _spellcheck_shard_size of them. The workers share the memory mapped
+    dictionaries of the calling process. Inside the daemonic processes of a
+    Celery prefork worker the pool is created with billiard which allows
+    them to have children. Other daemonic processes may not start a pool and
+    check all tokens themselves.
 
     Args:
         tokens (iterable): An iterable returning sequences of unicode
                            characters.
-        dictionary (unicode): Path to a base dictionary.
-        deletion_dictionary (unicode): Path to a deletion dictionary.
+        dictionary (unicode): Path to a base dictionary or DAWG.
+        deletion_dictionary (unicode): Path to a deletion dictionary or None.
+        depth (int): Edit distance of suggestions.
+        distances (bool): Switch to return tuples (suggestion, edit distance)
+                          instead of bare suggestions.
+        max_suggestions (int): Maximum number of suggestions per token.
+        cache (SuggestionCache): Cache of the ranked suggestions of tokens.
+        jobs (int): Number of processes computing suggestions.
 
     Returns:
         A dictionary containing a sorted (least to highest edit distance) list
@@ -76,19 +246,546 @@ def spellcheck(tokens, dictionary, deletion_dictionary):
         words but don't have spelling suggestions either will be contained in
         the result dictionary.
     """
+    tokens = set(alg.cached_sanitize(tok) for tok in tokens)
+    cached = cache.get_many(tokens) if cache is not None else {}
+    tokens.difference_update(cached)
+    if deletion_dictionary is None and not is_dawg(dictionary):
+        raise NidabaInvalidParameterException('Searching without a deletion '
+                                              'dictionary requires a DAWG.')
+    known = known_words(tokens, dictionary)
+    oov = tokens - known
+    pool = None
+    if jobs > 1 and len(oov) >= _spellcheck_shard_size:
+        pool = _process_pool(jobs)
+    if pool is not None:
+        rets = _sharded_suggestions(oov, dictionary, deletion_dictionary,
+                                    depth, pool, jobs)
+    else:
+        rets = _ranked_suggestions(oov, dictionary, deletion_dictionary, depth)
+    if cache is not None:
+        # known words are cached as None
+        new = dict.fromkeys(known)
+        new.update(rets)
+        cache.update(new)
+        rets.update((tok, ranked) for tok, ranked in cached.iteritems() if
+                    ranked is not None)
     suggestions = {}
-    for tok in tokens:
-        tok = alg.sanitize(tok)
-        if alg.mmap_bin_search(tok, dictionary,
-                               entryparser_fn=alg.key_for_single_word):
-            continue
-        if tok in suggestions:
-            continue
-        ret = alg.mapped_sym_suggest(tok, deletion_dictionary, dictionary, 1)
-        suggestions[tok] = alg.suggestions(tok, set.union(*ret.itervalues()))
+    for tok, ranked in rets.iteritems():
+        if max_suggestions is not None:
+            ranked = ranked[:max_suggestions]
+        if not distances:
+            ranked = [sugg for sugg, _ in ranked]
+        suggestions[tok] = ranked
     return suggestions
 
 
+def _ranked_suggestions(oov, dictionary, deletion_dictionary, depth):
+    """
+    Returns a dictionary mapping each token in oov to its ranked
+    suggestions.
+    """
+    if deletion_dictionary is None:
+        # the DAWG search already yields the exact edit distances
+        dawg = DAWG(dictionary)
+        return {tok: alg.rank_distances(dawg.search(tok, depth).iteritems())
+                for tok in oov}
+    words = DAWG(dictionary) if is_dawg(dictionary) else dictionary
+    rets = alg.bulk_mapped_sym_suggest(oov, deletion_dictionary, words, depth)
+    rets = {tok: set.union(*ret.itervalues()) for tok, ret in
+            rets.iteritems()}
+    freq = None
+    if not is_dawg(dictionary):
+        freq = alg.mmap_bulk_frequencies(set().union(*rets.itervalues()),
+                                         dictionary) or None
+    # symmetric deletion only finds words up to twice the depth away
+    return {tok: alg.ranked_suggestions(tok, ret, freq, max_distance=2 * depth)
+            for tok, ret in rets.iteritems()}
+
+
+def _process_pool(jobs):
+    """
+    Returns a pool of jobs processes or None if the current process is not
+    allowed to start child processes.
+
+    Celery workers are daemonic billiard processes. billiard permits them to
+    start children, so their pool is created by billiard. Daemonic processes
+    of the multiprocessing module may not have children.
+    """
+    try:
+        import billiard
+    except ImportError:
+        billiard = None
+    if billiard is not None and billiard.current_process().daemon:
+        return billiard.Pool(jobs)
+    if multiprocessing.current_process().daemon:
+        return None
+    return multiprocessing.Pool(jobs)
+
+
+def _spellcheck_shard(args):
+    """
+    Worker computing the ranked suggestions of a shard of tokens.
+    """
+    return _ranked_suggestions(*args)
+
+
+def _sharded_suggestions(oov, dictionary, deletion_dictionary, depth, pool,
+                         jobs):
+    """
+    Splits the sorted tokens in oov into shards whose ranked suggestions are
+    computed by a pool of jobs processes and merges the results. The pool is
+    closed afterwards.
+    """
+    # shards of consecutive tokens keep the bulk lookups local
+    oov = sorted(oov)
+    size = max(1, -(-len(oov) // (jobs * 4)))
+    tasks = ((oov[i:i + size], dictionary, deletion_dictionary, depth) for i
+             in xrange(0, len(oov), size))
+    rets = {}
+    try:
+        for part in pool.imap_unordered(_spellcheck_shard, tasks):
+            rets.update(part)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return rets
+
+
+def dictionary_identity(dictionary, deletion_dictionary, depth):
+    """
+    Returns a string identifying a spell checker configuration.
+
+    The identity is derived from the path, modification time, size, and inode
+    of the dictionaries and the dictionary's frequency column, so it changes
+    whenever one of them is rebuilt.
+
+    Args:
+        dictionary (unicode): Path to a base dictionary or DAWG.
+        deletion_dictionary (unicode): Path to a deletion dictionary or None.
+        depth (int): Edit distance of suggestions.
+
+    Returns:
+        unicode: A hexadecimal digest.
+    """
+    ident = hashlib.sha1(str(depth))
+    for path in (dictionary, deletion_dictionary,
+                 alg.frequency_column_path(dictionary)):
+        if path is None or not os.path.isfile(path):
+            ident.update(b'\0')
+            continue
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        ident.update(repr((path, st.st_mtime, st.st_size, st.st_ino)))
+    return ident.hexdigest().decode('ascii')
+
+
+def _encode_suggestions(ranked):
+    return json.dumps(ranked, ensure_ascii=False)
+
+
+def _decode_suggestions(val):
+    ranked = json.loads(val)
+    if ranked is None:
+        return None
+    return [(sugg, dist) for sugg, dist in ranked]
+
+
+class SuggestionCache(object):
+    """
+    Caches the ranked spelling suggestions of tokens for a single spell
+    checker configuration.
+
+    Recently used tokens are kept in an in-process LRU. An optional shared
+    store (DiskSuggestionStore or RedisSuggestionStore) is consulted for
+    tokens missing from it and receives all newly checked tokens, making
+    them available to other worker processes and later tasks. Tokens
+    contained in the dictionary are cached as None.
+
+    Args:
+        identity (unicode): Identity of the dictionaries (see
+                            dictionary_identity).
+        maxsize (int): Maximum number of tokens kept in process.
+        store (object): Optional shared store.
+    """
+    def __init__(self, identity, maxsize=suggestion_cache_size, store=None):
+        self.identity = identity
+        self.maxsize = maxsize
+        self.store = store
+        self._lru = OrderedDict()
+        self.hits = self.shared_hits = self.misses = 0
+
+    def get_many(self, tokens):
+        """
+        Returns a dictionary mapping the cached tokens of an iterable to
+        their ranked suggestions.
+        """
+        results = {}
+        missing = []
+        for tok in tokens:
+            ranked = self._lru.pop(tok, self._lru)
+            if ranked is self._lru:
+                missing.append(tok)
+            else:
+                self._lru[tok] = results[tok] = ranked
+        self.hits += len(results)
+        if missing and self.store is not None:
+            shared = self.store.get_many(self.identity, missing)
+            self.shared_hits += len(shared)
+            self._insert(shared)
+            results.update(shared)
+        else:
+            shared = ()
+        self.misses += len(missing) - len(shared)
+        return results
+
+    def update(self, mapping):
+        """
+        Adds the tokens and ranked suggestions of mapping to the cache.
+        """
+        self._insert(mapping)
+        if mapping and self.store is not None:
+            self.store.set_many(self.identity, mapping)
+
+    def _insert(self, mapping):
+        for tok, ranked in mapping.iteritems():
+            self._lru.pop(tok, None)
+            self._lru[tok] = ranked
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def info(self):
+        """
+        Returns a dictionary containing the number of tokens found in
+        process, found in the shared store, and not found at all, the hit
+        rate, and the number of tokens currently kept in process.
+        """
+        lookups = self.hits + self.shared_hits + self.misses
+        rate = 0.0
+        if lookups:
+            rate = float(self.hits + self.shared_hits) / lookups
+        return {'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': rate,
+                'size': len(self._lru),
+                'maxsize': self.maxsize}
+
+    def clear(self):
+        """
+        Empties the in-process tier and resets the counters.
+        """
+        self._lru.clear()
+        self.hits = self.shared_hits = self.misses = 0
+
+
+_suggestion_caches = OrderedDict()
+
+
+def suggestion_cache(dictionary, deletion_dictionary, depth,
+                     maxsize=suggestion_cache_size, store=None):
+    """
+    Returns the suggestion cache of a spell checker configuration.
+
+    Caches are kept in a process-wide registry keyed by the identity of the
+    dictionaries, so subsequent tasks executed by a worker reuse the same
+    cache and rebuilt dictionaries automatically get a new one. When more
+    than max_suggestion_caches exist the least recently used one is dropped.
+
+    Args:
+        dictionary (unicode): Path to a base dictionary or DAWG.
+        deletion_dictionary (unicode): Path to a deletion dictionary or None.
+        depth (int): Edit distance of suggestions.
+        maxsize (int): Maximum number of tokens kept in process.
+        store (object): Optional shared store.
+
+    Returns:
+        SuggestionCache: The cache of the configuration.
+    """
+    identity = dictionary_identity(dictionary, deletion_dictionary, depth)
+    cache = _suggestion_caches.pop(identity, None)
+    if cache is None:
+        cache = SuggestionCache(identity, maxsize, store)
+    cache.maxsize = maxsize
+    cache.store = store
+    _suggestion_caches[identity] = cache
+    while len(_suggestion_caches) > max_suggestion_caches:
+        _suggestion_caches.popitem(last=False)
+    return cache
+
+
+class DiskSuggestionStore(object):
+    """
+    A shared suggestion store on a file system, e.g. beneath the common
+    storage medium.
+
+    The suggestions of each configuration are stored in a directory named
+    by its identity as a sequence of immutable runs. A run is a sorted
+    dictionary of token and suggestion list pairs with a line offset index.
+    Runs and their indices stay memory mapped between lookups in a registry
+    of their own, so they never displace the spell checker's dictionaries
+    from the dictionary registry. New tokens are written as a new run; once
+    more than max_runs exist they are merged into a single run containing at
+    most max_entries tokens, dropping the oldest runs first. Runs are only
+    ever renamed into place or removed, so concurrent workers need no
+    locking.
+
+    Args:
+        directory (unicode): Directory to store the runs in.
+        max_runs (int): Number of runs before they are merged.
+        max_entries (int): Approximate maximum number of tokens stored for
+                           a configuration.
+    """
+    run_suffix = u'.run'
+
+    def __init__(self, directory, max_runs=8, max_entries=2 ** 20):
+        self.directory = directory
+        self.max_runs = max_runs
+        self.max_entries = max_entries
+
+    def _runs(self, identity):
+        # run names start with their creation time, i.e. newest first
+        return sorted(glob.glob(os.path.join(self.directory, identity, '*' +
+                                             self.run_suffix)), reverse=True)
+
+    def _remove_run(self, run):
+        _unmap_run(run)
+        for path in (run, alg.line_index_path(run)):
+            try:
+                os.unlink(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    def get_many(self, identity, tokens):
+        """
+        Returns a dictionary mapping the stored tokens of an iterable to
+        their ranked suggestions.
+        """
+        results = {}
+        keys = sorted(set(tokens))
+        runs = self._runs(identity)
+        # drop maps of runs removed by merges of other processes
+        directory = os.path.join(self.directory, identity)
+        for run in [x for x in _mapped_runs if os.path.dirname(x) ==
+                    directory and x not in runs]:
+            _unmap_run(run)
+        for run in runs:
+            if not keys:
+                break
+            try:
+                mm, idx = _mapped_run(run)
+            except (IOError, OSError, ValueError):
+                # removed by a concurrent merge or invalid
+                continue
+            entries = alg.indexed_bulk_search(keys, mm, idx)
+            for tok, val in entries.iteritems():
+                results[tok] = _decode_suggestions(val)
+            keys = [tok for tok in keys if tok not in entries]
+        return results
+
+    def set_many(self, identity, mapping):
+        """
+        Writes the tokens and ranked suggestions of mapping to a new run.
+        """
+        lines = [u'{}\t{}'.format(tok, _encode_suggestions(ranked)) for tok,
+                 ranked in sorted(mapping.iteritems()) if not
+                 regex.search(u'[\t\n\r]', tok)]
+        if not lines:
+            return
+        self._write_run(identity, lines)
+        runs = self._runs(identity)
+        if len(runs) > self.max_runs:
+            self._merge(identity, runs)
+
+    def _write_run(self, identity, lines):
+        directory = os.path.join(self.directory, identity)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+        name = u'{:017d}-{}'.format(int(time.time() * 1e6), uuid.uuid4().hex)
+        tmp = os.path.join(directory, name + u'.tmp')
+        run = os.path.join(directory, name + self.run_suffix)
+        _write_indexed_lines(tmp, lines)
+        # the index is moved first as runs become visible with their data
+        os.rename(alg.line_index_path(tmp), alg.line_index_path(run))
+        os.rename(tmp, run)
+
+    def _merge(self, identity, runs):
+        kept = []
+        entries = 0
+        for run in runs:
+            try:
+                entries += os.path.getsize(alg.line_index_path(run)) // \
+                    alg.line_offset.size - 1
+            except OSError:
+                continue
+            kept.append(run)
+            if entries >= self.max_entries:
+                break
+        fps = []
+        try:
+            for run in kept:
+                try:
+                    fps.append(open(run, 'rb'))
+                except IOError:
+                    pass
+            # newer runs come first and win ties
+            merged = heapq.merge(*[_run_entries(fp, age) for age, fp in
+                                   enumerate(fps)])
+            lines = (line.rstrip(u'\n') for _, line in
+                     (next(group) for _, group in
+                      itertools.groupby(merged, key=lambda x: x[0][0])))
+            self._write_run(identity, lines)
+        finally:
+            for fp in fps:
+                fp.close()
+        for run in runs:
+            self._remove_run(run)
+
+    def clear(self, identity):
+        """
+        Removes all stored suggestions of a configuration.
+        """
+        for run in self._runs(identity):
+            self._remove_run(run)
+
+
+def _run_entries(fp, age):
+    """
+    Yields a tuple ((token, age), line) for each line of a suggestion run.
+    """
+    for line in fp:
+        line = line.decode('utf-8')
+        yield (line.split(u'\t', 1)[0], age), line
+
+
+# Maximum number of suggestion runs kept mapped by a single process.
+max_mapped_runs = 32
+
+# Maps paths of suggestion runs to tuples (mmap of run, mmap of index). Runs
+# are immutable and their names unique so they never have to be remapped.
+_mapped_runs = OrderedDict()
+
+
+def _mapped_run(run):
+    """
+    Returns memory maps of a suggestion run and its line offset index.
+    """
+    entry = _mapped_runs.pop(run, None)
+    if entry is None:
+        with open(run, 'rb') as f, \
+                open(alg.line_index_path(run), 'rb') as fp:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                idx = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except:
+                mm.close()
+                raise
+        if len(idx) % alg.line_offset.size or \
+           alg.line_offset.unpack_from(idx, len(idx) -
+                                       alg.line_offset.size)[0] != len(mm):
+            mm.close()
+            idx.close()
+            raise ValueError('Invalid line index of run {}'.format(run))
+        entry = (mm, idx)
+    _mapped_runs[run] = entry
+    while len(_mapped_runs) > max_mapped_runs:
+        for m in _mapped_runs.popitem(last=False)[1]:
+            m.close()
+    return entry
+
+
+def _unmap_run(run):
+    """
+    Closes the maps of a suggestion run.
+    """
+    for m in _mapped_runs.pop(run, ()):
+        m.close()
+
+
+class RedisSuggestionStore(object):
+    """
+    A shared suggestion store in a Redis database.
+
+    The suggestions of each configuration are kept in a single hash. As a
+    crude bound on its size the hash is dropped once it contains more than
+    max_entries tokens and optionally expires after ttl seconds without
+    writes.
+
+    Args:
+        redis (redis.StrictRedis): Connection to the database, e.g.
+                                   nidaba.config.Redis.
+        prefix (unicode): Prefix of the hash names.
+        max_entries (int): Maximum number of tokens stored for a
+                           configuration.
+        ttl (int): Optional expiry in seconds.
+    """
+    def __init__(self, redis, prefix=u'nidaba:spellcheck:',
+                 max_entries=2 ** 20, ttl=None):
+        self.redis = redis
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def get_many(self, identity, tokens):
+        """
+        Returns a dictionary mapping the stored tokens of an iterable to
+        their ranked suggestions.
+        """
+        tokens = list(tokens)
+        if not tokens:
+            return {}
+        vals = self.redis.hmget(self.prefix + identity,
+                                [tok.encode('utf-8') for tok in tokens])
+        return {tok: _decode_suggestions(val.decode('utf-8')) for tok, val in
+                itertools.izip(tokens, vals) if val is not None}
+
+    def set_many(self, identity, mapping):
+        """
+        Stores the tokens and ranked suggestions of mapping.
+        """
+        name = self.prefix + identity
+        with self.redis.pipeline() as pipe:
+            pipe.hmset(name, {tok.encode('utf-8'):
+                              _encode_suggestions(ranked).encode('utf-8') for
+                              tok, ranked in mapping.iteritems()})
+            if self.ttl:
+                pipe.expire(name, self.ttl)
+            pipe.hlen(name)
+            size = pipe.execute()[-1]
+        if size > self.max_entries:
+            self.redis.delete(name)
+
+    def clear(self, identity):
+        """
+        Removes all stored suggestions of a configuration.
+        """
+        self.redis.delete(self.prefix + identity)
+
+
+def iter_cleanlines(path, encoding=u'utf-8', normalization=u'NFD'):
+    """
+    Read in lines from a file and yield them sanitized one at a time.
+    Non-unique lines will be repeated.
+
+    Args:
+        path (unicode): Absolute path of the file to be read
+        encoding (unicode): Encoding to use for decoding the file
+        normalization (unicode): Normalization format to use
+
+    Yields:
+        unicode: A sanitized line.
+    """
+    with codecs.open(path, u'r', encoding=encoding) as lines:
+        for line in lines:
+            yield alg.sanitize(line, normalization=normalization)
+
+
 def cleanlines(path, encoding=u'utf-8', normalization=u'NFD'):
     """
     Read in lines from a file and return them as a sanitized list.
@@ -103,11 +800,33 @@ def cleanlines(path, encoding=u'utf-8', normalization=u'NFD'):
         list: List of lines containing the sanitized output, i.e. normalized
               unicode objects.
     """
-    words = []
+    return list(iter_cleanlines(path, encoding, normalization))
+
+
+def _clean_line_words(lines, normalization):
+    for line in lines:
+        for seg in line.split(u' '):
+            clean = alg.cached_sanitize(seg, normalization=normalization)
+            if clean != u'':
+                yield clean
+
+
+def iter_cleanwords(path, encoding=u'utf-8', normalization=u'NFD'):
+    """
+    Read in every word from a file as separated by lines and spaces and yield
+    them sanitized one at a time. Non-unique words will be repeated.
+
+    Args:
+        path (unicode): Absolute path of the file to be read
+        encoding (unicode): Encoding to use for decoding the file
+        normalization (unicode): Normalization format to use
+
+    Yields:
+        unicode: A sanitized word.
+    """
     with codecs.open(path, u'r', encoding=encoding) as lines:
-        for line in lines:
-            words.append(alg.sanitize(line, normalization=normalization))
-    return words
+        for word in _clean_line_words(lines, normalization):
+            yield word
 
 
 def cleanwords(path, encoding=u'utf-8', normalization=u'NFD'):
@@ -125,17 +844,11 @@ def cleanwords(path, encoding=u'utf-8', normalization=u'NFD'):
         list: List of words containing the sanitized output, i.e. normalized
               unicode objects.
     """
-    words = []
-    with codecs.open(path, u'r', encoding=encoding) as lines:
-        for line in lines:
-            for seg in line.split(u' '):
-                clean = alg.sanitize(seg, normalization=normalization)
-                if clean != u'':
-                    words.append(clean)
-    return words
+    return list(iter_cleanwords(path, encoding, normalization))
 
 
-def uniquewords_with_freq(path, encoding=u'utf-8', normalization=u'NFD'):
+def uniquewords_with_freq(path, encoding=u'utf-8', normalization=u'NFD',
+                          jobs=1):
     """
     Read in every word from a file as separated by lines and spaces.
     Return a counter (behaves like a dictionary) of unique words
@@ -145,16 +858,18 @@ def uniquewords_with_freq(path, encoding=u'utf-8', normalization=u'NFD'):
         path (unicode): Absolute path of the file to be read
         encoding (unicode): Encoding to use for decoding the file
         normalization (unicode): Normalization format to use
+        jobs (int): Number of processes reading parts of the file
 
     Returns:
         Counter: Contains the frequency of each token
     """
-    words = cleanwords(path, encoding=encoding, normalization=normalization)
-    freq = Counter(words)
-    return freq
+    if jobs > 1:
+        return _merged_corpus([path], encoding, normalization, jobs, Counter)
+    return Counter(iter_cleanwords(path, encoding=encoding,
+                                   normalization=normalization))
 
 
-def cleanuniquewords(path, encoding=u'utf-8', normalization=u'NFD'):
+def cleanuniquewords(path, encoding=u'utf-8', normalization=u'NFD', jobs=1):
     """
     Read in lines from a file as separated by lines and spaces,
     convert them to the specified normalization, and return a set
@@ -164,12 +879,38 @@ def cleanuniquewords(path, encoding=u'utf-8', normalization=u'NFD'):
         path (unicode): Absolute path of the file to be read
         encoding (unicode): Encoding to use for decoding the file
         normalization (unicode): Normalization format to use
+        jobs (int): Number of processes reading parts of the file
 
     Returns:
         set: Set of unique tokens
     """
-    return set(cleanwords(path, encoding=encoding,
-                          normalization=normalization))
+    if jobs > 1:
+        return _merged_corpus([path], encoding, normalization, jobs, set)
+    return set(iter_cleanwords(path, encoding=encoding,
+                               normalization=normalization))
+
+
+def _corpus_files(dirpath):
+    return filter(os.path.isfile, glob.glob(dirpath + '/*'))
+
+
+def iter_words_from_files(dirpath, encoding=u'utf-8', normalization=u'NFD'):
+    """
+    Yields the sanitized words of all text files in a directory one at a
+    time.
+
+    Args:
+        dirpath (unicode): Absolute path of the directory to enter
+        encoding (unicode): Encoding to use for decoding the files
+        normalization (unicode): Normalization format to use
+
+    Yields:
+        unicode: A sanitized word.
+    """
+    for filename in _corpus_files(dirpath):
+        for word in iter_cleanwords(filename, encoding=encoding,
+                                    normalization=normalization):
+            yield word
 
 
 def words_from_files(dirpath, encoding=u'utf-8', normalization=u'NFD'):
@@ -185,14 +926,11 @@ def words_from_files(dirpath, encoding=u'utf-8', normalization=u'NFD'):
     Returns:
         list: List of words of all files in the directory
     """
-    words = []
-    for filename in filter(os.path.isfile, glob.glob(dirpath + '/*')):
-        words += cleanwords(filename, encoding=encoding,
-                            normalization=normalization)
-    return words
+    return list(iter_words_from_files(dirpath, encoding, normalization))
 
 
-def unique_words_from_files(dirpath, encoding=u'utf-8', normalization=u'NFD'):
+def unique_words_from_files(dirpath, encoding=u'utf-8', normalization=u'NFD',
+                            jobs=1):
     """
     Create a set of unique words from a directory of text files.  All file in
     the given directory will be parsed.
@@ -201,36 +939,137 @@ def unique_words_from_files(dirpath, encoding=u'utf-8', normalization=u'NFD'):
         dirpath (unicode): Absolute path of the directory to enter
         encoding (unicode): Encoding to use for decoding the files
         normalization (unicode): Normalization format to use
+        jobs (int): Number of processes reading the files
 
     Returns:
         set: Set of words of all files in the directory
     """
-    return set(words_from_files(dirpath, encoding=encoding,
-                                normalization=normalization))
+    if jobs > 1:
+        return _merged_corpus(_corpus_files(dirpath), encoding, normalization,
+                              jobs, set)
+    return set(iter_words_from_files(dirpath, encoding=encoding,
+                                     normalization=normalization))
+
+
+def word_frequencies_from_files(dirpath, encoding=u'utf-8',
+                                normalization=u'NFD', jobs=1):
+    """
+    Counts the words of all text files in a directory.
+
+    Args:
+        dirpath (unicode): Absolute path of the directory to enter
+        encoding (unicode): Encoding to use for decoding the files
+        normalization (unicode): Normalization format to use
+        jobs (int): Number of processes reading the files
+
+    Returns:
+        Counter: Contains the frequency of each token
+    """
+    if jobs > 1:
+        return _merged_corpus(_corpus_files(dirpath), encoding, normalization,
+                              jobs, Counter)
+    return Counter(iter_words_from_files(dirpath, encoding=encoding,
+                                         normalization=normalization))
+
+
+def _corpus_chunks(paths, encoding, chunk_size):
+    """
+    Splits files into chunks of about chunk_size bytes ending on a line
+    break. Files in encodings whose line breaks aren't single newline bytes,
+    e.g. UTF-16, are not split.
+    """
+    splittable = u'\n'.encode(encoding) == b'\n'
+    for path in paths:
+        size = os.path.getsize(path)
+        if not splittable:
+            yield path, 0, size
+            continue
+        with open(path, 'rb') as fp:
+            start = 0
+            while start < size:
+                fp.seek(min(start + chunk_size, size))
+                fp.readline()
+                end = min(fp.tell(), size)
+                yield path, start, end
+                start = end
+
+
+def _corpus_chunk(args):
+    """
+    Reads the words of a chunk of a file into a container (set or Counter).
+    """
+    path, start, end, encoding, normalization, container = args
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        text = fp.read(end - start).decode(encoding)
+    return container(_clean_line_words(text.splitlines(True), normalization))
+
+
+def _merged_corpus(paths, encoding, normalization, jobs, container):
+    """
+    Reads the words of a number of files in chunks of _corpus_chunk_size
+    bytes using a pool of jobs processes and merges the resulting sets or
+    Counters.
+    """
+    tasks = ((path, start, end, encoding, normalization, container) for
+             path, start, end in _corpus_chunks(paths, encoding,
+                                                _corpus_chunk_size))
+    merged = container()
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for part in pool.imap_unordered(_corpus_chunk, tasks):
+            merged.update(part)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return merged
 
 
-def make_dict(outpath, iterable, encoding=u'utf-8'):
+def make_dict(outpath, iterable, encoding=u'utf-8', frequencies=None):
     """
     Create a file at outpath and write evrey object in iterable to its
-    own line. The file is opened in append mode.
+    own line. A line offset index is written next to it (see
+    nidaba.algorithms.string.line_index_path). As the dictionary is searched
+    using a binary search the iterable has to return objects in ascending
+    order.
+
+    If a mapping of words to corpus frequencies (e.g. the Counter returned
+    by uniquewords_with_freq) is given, the frequency of each line is
+    written to a frequency column next to the dictionary (see
+    nidaba.algorithms.string.frequency_column_path). Frequencies are
+    saturated at 2**32 - 1.
 
     Args:
         outpath (unicode): File path to write to
         iterable (iterable): An iterable used as a data source
-        normalization (unicode): Normalization format to use
+        encoding (unicode): Encoding of the output file
+        frequencies (dict): Optional mapping of words to frequencies
     """
-    with codecs.open(outpath, u'w+', encoding=encoding) as f:
-        for s in iterable:
-            f.write(s + u'\n')
+    if frequencies is None:
+        _write_indexed_lines(outpath, iterable, encoding=encoding)
+        return
+    max_freq = 2 ** 32 - 1
+    with _replaced_file(alg.frequency_column_path(outpath)) as freq:
+        def _lines():
+            for line in iterable:
+                count = min(frequencies.get(line, 0), max_freq)
+                freq.write(alg.frequency_entry.pack(count))
+                yield line
+        _write_indexed_lines(outpath, _lines(), encoding=encoding)
 
 
 def make_deldict(outpath, words, depth):
     """
     Creates a symmetric deletion dictionary from the specified word list.
+    A line offset index is written next to it.
 
     WARNING! This is a naive approach, which requires all the variants to be
     stored in memory. For large dictionaries at higher depth, this can easily
-    use all available memory on most machines.
+    use all available memory on most machines. Use make_deldict_external in
+    these cases.
 
     Args:
         outpath (unicode): File path to write to
@@ -239,13 +1078,584 @@ def make_deldict(outpath, words, depth):
     """
     variant_dict = {}
     for word in words:
-        for var in alg.strings_by_deletion(word, depth):
+        for var in alg.deletion_variants(word, depth):
             if var not in variant_dict:
                 variant_dict[var] = []
             variant_dict[var].append(word)
     ordered = sorted(variant_dict.keys())
 
-    with codecs.open(outpath, u'w+', encoding='utf-8') as outfile:
-        for key in ordered:
-            originals = u' '.join(variant_dict[key])
-            outfile.write(u'%s\t%s' % (key, originals) + u'\n')
+    _write_indexed_lines(outpath, (u'%s\t%s' % (key,
+                                               u' '.join(variant_dict[key]))
+                                   for key in ordered))
+
+
+def make_deldict_external(outpath, words, depth, memory=512, tmpdir=None,
+                          jobs=1):
+    """
+    Creates a symmetric deletion dictionary from the specified word list
+    using bounded memory.
+
+    Pairs of variants and words are buffered until the memory budget is
+    exhausted, sorted, and spilled to temporary files. The sorted runs are
+    then merged into the final dictionary. The output is identical to the
+    one of make_deldict.
+
+    With more than one job the word list is split into shards which are
+    processed by a pool of worker processes sharing the memory budget. Each
+    worker spills the sorted runs of its shards which are merged by the
+    calling process.
+
+    Args:
+        outpath (unicode): File path to write to
+        words (iterable): An iterable returning a single word per iteration
+        depth (int): Maximum edit distance to calculate
+        memory (int): Approximate memory budget for buffered variants in MiB
+        tmpdir (unicode): Directory for temporary files. Defaults to the
+                          system's temporary directory.
+        jobs (int): Number of worker processes
+    """
+    max_pairs = max(1, int(memory * 2 ** 20) // _pair_size // jobs)
+    # paths of all runs not yet unlinked
+    runs = []
+    buf = []
+    # runs are spilled into a private directory which also catches runs of
+    # workers whose results are lost when the pool fails
+    workdir = tempfile.mkdtemp(dir=tmpdir)
+    try:
+        if jobs > 1:
+            words = list(words)
+            # a few shards per worker keep the pool busy on skewed shards
+            size = max(1, -(-len(words) // (jobs * 4)))
+            shards = ((words[i:i + size], i, depth, max_pairs, workdir) for i
+                      in xrange(0, len(words), size))
+            pool = multiprocessing.Pool(jobs)
+            try:
+                for shard_runs in pool.imap_unordered(_deldict_shard, shards):
+                    runs.extend(shard_runs)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            shard_runs, buf = _deldict_runs(words, 0, depth, max_pairs,
+                                            workdir)
+            runs.extend(shard_runs)
+        while len(runs) > _merge_fan_in:
+            batch = runs[:_merge_fan_in]
+            runs.append(_spill_run(heapq.merge(*[_read_run(r) for r in
+                                                 batch]),
+                                   workdir, presorted=True))
+            for r in batch:
+                runs.remove(r)
+                _unlink_run(r)
+        pairs = heapq.merge(buf, *[_read_run(r) for r in runs])
+        _write_indexed_lines(outpath, _deldict_entries(pairs))
+    finally:
+        while runs:
+            _unlink_run(runs.pop())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _deldict_runs(words, start, depth, max_pairs, tmpdir=None):
+    """
+    Generates the (variant, index, word) tuples of words numbered from start
+    on and spills them in sorted runs of max_pairs tuples. Returns the paths
+    of the runs and the sorted remainder.
+    """
+    runs = []
+    buf = []
+    try:
+        for idx, word in enumerate(words, start):
+            for var in alg.deletion_variants(word, depth):
+                buf.append((var, idx, word))
+            if len(buf) >= max_pairs:
+                runs.append(_spill_run(buf, tmpdir))
+                buf = []
+    except:
+        for r in runs:
+            _unlink_run(r)
+        raise
+    buf.sort()
+    return runs, buf
+
+
+def _deldict_shard(args):
+    """
+    Worker function of make_deldict_external spilling all variants of a
+    shard of the word list. Returns the paths of the sorted runs.
+    """
+    words, start, depth, max_pairs, tmpdir = args
+    runs, buf = _deldict_runs(words, start, depth, max_pairs, tmpdir)
+    if buf:
+        runs.append(_spill_run(buf, tmpdir, presorted=True))
+    return runs
+
+
+def _deldict_entries(pairs):
+    """
+    Joins a sorted iterable of (variant, index, word) tuples into deletion
+    dictionary entries.
+    """
+    for var, group in itertools.groupby(pairs, key=operator.itemgetter(0)):
+        yield u'%s\t%s' % (var, u' '.join(x[2] for x in group))
+
+
+def _spill_run(pairs, tmpdir=None, presorted=False):
+    """
+    Writes (variant, index, word) tuples in ascending order to a temporary
+    file and returns its path.
+    """
+    if not presorted:
+        pairs.sort()
+    fd, path = tempfile.mkstemp(dir=tmpdir)
+    with os.fdopen(fd, 'wb') as run:
+        for var, idx, word in pairs:
+            run.write(u'{}\t{}\t{}\n'.format(var, idx, word).encode('utf-8'))
+    return path
+
+
+def _unlink_run(path):
+    """
+    Removes a run, ignoring runs that have already been removed.
+    """
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def _read_run(path):
+    """
+    Yields the (variant, index, word) tuples of a run written by _spill_run.
+    """
+    with open(path, 'rb') as run:
+        for line in run:
+            var, idx, word = line.decode('utf-8')[:-1].split(u'\t')
+            yield (var, int(idx), word)
+
+
+def make_hashed_deldict(outpath, del_dict_path):
+    """
+    Compiles a symmetric deletion dictionary into a hashed deletion
+    dictionary (see nidaba.algorithms.string.hashed_del_dict_lookup).
+
+    The hashed form can be used everywhere a deletion dictionary is expected.
+    Each variant is found with a single hash table probe and only a
+    fingerprint of each variant is stored, while each word is stored once and
+    referenced by its id, so the result is usually much smaller than the text
+    dictionary. Compilation requires around 30 bytes of memory per variant in
+    addition to the word table.
+
+    Args:
+        outpath (unicode): File path to write to
+        del_dict_path (unicode): Path to a deletion dictionary as created by
+                                 make_deldict.
+    """
+    def entries():
+        with open(del_dict_path, 'rb') as fp:
+            for line in fp:
+                key, val = line.rstrip(b'\n').split(b'\t')
+                yield key, val.split(b' ')
+
+    # first pass: fingerprints, word ids, and postings offsets
+    word_ids = {}
+    fps = []
+    fp_chunks = []
+    postings_idx = array.array(b'I')
+    postings_size = 0
+    for key, words in entries():
+        fps.append(alg.del_dict_fingerprint(key))
+        if len(fps) == 2 ** 20:
+            fp_chunks.append(numpy.array(fps, dtype=numpy.uint64))
+            fps = []
+        for word in words:
+            word_ids.setdefault(word, len(word_ids))
+        if len(words) == 1:
+            postings_idx.append(alg.hashed_del_dict_inline |
+                                word_ids[words[0]])
+        else:
+            postings_idx.append(postings_size)
+            postings_size += len(words) + 1
+    fp_chunks.append(numpy.array(fps, dtype=numpy.uint64))
+    fps = numpy.concatenate(fp_chunks)
+    del fp_chunks
+    words = sorted(word_ids, key=word_ids.get)
+
+    # around 4 variants per bucket
+    buckets = 1
+    while buckets * 4 < len(fps):
+        buckets *= 2
+    bucket_of = (fps & numpy.uint64(buckets - 1)).astype(numpy.int64)
+    order = numpy.argsort(bucket_of, kind='mergesort')
+    bucket_idx = numpy.zeros(buckets + 1, dtype='<u4')
+    bucket_idx[1:] = numpy.cumsum(numpy.bincount(bucket_of, minlength=buckets))
+    del bucket_of
+
+    buckets_off = alg.hashed_del_dict_header.size
+    fps_off = buckets_off + 4 * (buckets + 1)
+    postings_idx_off = fps_off + 8 * len(fps)
+    postings_off = postings_idx_off + 4 * len(fps)
+    words_off = postings_off + 4 * postings_size
+    word_table_off = words_off + alg.line_offset.size * (len(words) + 1)
+    size = word_table_off + sum(len(w) for w in words)
+
+    with _replaced_file(outpath, 'w+b') as fp:
+        fp.truncate(size)
+        mm = mmap.mmap(fp.fileno(), size)
+        try:
+            alg.hashed_del_dict_header.pack_into(mm, 0,
+                                                 alg.hashed_del_dict_magic, 1,
+                                                 buckets, len(fps),
+                                                 len(words), buckets_off,
+                                                 fps_off, postings_idx_off,
+                                                 postings_off, words_off)
+            mm[buckets_off:fps_off] = bucket_idx.tostring()
+            mm[fps_off:postings_idx_off] = fps[order].astype('<u8').tostring()
+            del fps
+            postings_idx = numpy.frombuffer(postings_idx, dtype=numpy.uint32)
+            postings_idx = postings_idx[order].astype('<u4')
+            mm[postings_idx_off:postings_off] = postings_idx.tostring()
+            del order
+            # second pass: postings
+            pos = postings_off
+            for key, vals in entries():
+                if len(vals) == 1:
+                    continue
+                ids = numpy.array([len(vals)] + [word_ids[w] for w in vals],
+                                  dtype='<u4').tostring()
+                mm[pos:pos + len(ids)] = ids
+                pos += len(ids)
+            # word table
+            offsets = numpy.zeros(len(words) + 1, dtype='<u8')
+            offsets[1:] = numpy.cumsum([len(w) for w in words])
+            mm[words_off:word_table_off] = offsets.tostring()
+            mm[word_table_off:] = b''.join(words)
+            mm.flush()
+        finally:
+            mm.close()
+
+
+@contextlib.contextmanager
+def _replaced_file(path, mode='wb'):
+    """
+    Opens a temporary file next to path and moves it over path once the
+    block has been left without an exception.
+
+    Dictionaries are memory mapped by workers (see
+    nidaba.algorithms.string.mapped_dictionary). Truncating a mapped file
+    kills its readers with SIGBUS, so dictionaries are never rewritten in
+    place. Readers keep the old inode until they remap the new file.
+    """
+    tmp = u'{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, mode) as fp:
+            yield fp
+        os.rename(tmp, path)
+    except BaseException:
+        _unlink_run(tmp)
+        raise
+
+
+def make_line_index(path):
+    """
+    Creates the line offset index for an existing dictionary, e.g. one
+    created by an older version of nidaba.
+
+    Args:
+        path (unicode): Path of the dictionary
+    """
+    offset = 0
+    with open(path, 'rb') as f, \
+            _replaced_file(alg.line_index_path(path)) as idx:
+        for line in f:
+            idx.write(alg.line_offset.pack(offset))
+            offset += len(line)
+        idx.write(alg.line_offset.pack(offset))
+
+
+def _write_indexed_lines(outpath, lines, encoding=u'utf-8'):
+    """
+    Writes each unicode object in lines to its own line of a file at outpath
+    and the offset of each line into the line offset index next to it.
+    """
+    offset = 0
+    # the index is replaced first as the data is checked against it
+    with _replaced_file(outpath) as f, \
+            _replaced_file(alg.line_index_path(outpath)) as idx:
+        for line in lines:
+            idx.write(alg.line_offset.pack(offset))
+            raw = (line + u'\n').encode(encoding)
+            f.write(raw)
+            offset += len(raw)
+        idx.write(alg.line_offset.pack(offset))
+
+
+# A DAWG (directed acyclic word graph) word list is a minimized automaton
+# accepting exactly the words of a dictionary. All integers are little-endian
+# uint32. The file consists of a header (magic, version, offset of the root
+# node, and a flag marking the empty word as contained) followed by the nodes.
+# Each node is the number of its outgoing edges followed by one (label, target)
+# pair per edge in ascending label order. Labels contain the code point of
+# the edge shifted left by one, with the lowest bit set if the target node
+# completes a word. Targets and the root are offsets in units of 4 bytes.
+dawg_magic = b'NDWG'
+_dawg_header = struct.Struct(b'<4sIII')
+
+
+class _DAWGNode(object):
+    """
+    Node of a DAWG under construction.
+    """
+    __slots__ = ['id', 'final', 'edges']
+
+    def __init__(self, id):
+        self.id = id
+        self.final = False
+        self.edges = {}
+
+    def signature(self):
+        return (self.final, tuple(sorted((label, node.id) for label, node in
+                                         self.edges.iteritems())))
+
+
+def make_dawg(outpath, words):
+    """
+    Creates a memory mappable DAWG containing all words of a sorted word
+    list.
+
+    The DAWG is a drop-in replacement for a plain dictionary as created by
+    make_dict, i.e. it can be configured as the 'dictionary' of a language and
+    passed to spellcheck. As common prefixes and suffixes of words are shared
+    it is usually considerably smaller than the plain word list.
+
+    Args:
+        outpath (unicode): File path to write to
+        words (iterable): An iterable returning words in ascending order.
+
+    Raises:
+        NidabaAlgorithmException if the words are not sorted.
+    """
+    ids = itertools.count()
+    root = _DAWGNode(next(ids))
+    register = {}
+    # path of (parent, label, child) tuples of the last word not yet
+    # minimized
+    unchecked = []
+
+    def minimize(depth):
+        while len(unchecked) > depth:
+            parent, label, child = unchecked.pop()
+            sig = child.signature()
+            if sig in register:
+                parent.edges[label] = register[sig]
+            else:
+                register[sig] = child
+
+    prev = None
+    for word in words:
+        if prev is not None and word <= prev:
+            if word == prev:
+                continue
+            raise NidabaAlgorithmException('Word list not sorted')
+        prefix = len(os.path.commonprefix([word, prev or u'']))
+        minimize(prefix)
+        node = unchecked[-1][2] if unchecked else root
+        for c in word[prefix:]:
+            child = _DAWGNode(next(ids))
+            node.edges[ord(c)] = child
+            unchecked.append((node, ord(c), child))
+            node = child
+        node.final = True
+        prev = word
+    minimize(0)
+
+    # assign offsets to all nodes reachable from the root
+    offsets = {}
+    nodes = []
+    stack = [root]
+    pos = _dawg_header.size // 4
+    while stack:
+        node = stack.pop()
+        if node.id in offsets:
+            continue
+        offsets[node.id] = pos
+        nodes.append(node)
+        pos += 1 + 2 * len(node.edges)
+        stack.extend(node.edges.itervalues())
+
+    with _replaced_file(outpath) as fp:
+        fp.write(_dawg_header.pack(dawg_magic, 1, offsets[root.id],
+                                   int(root.final)))
+        for node in nodes:
+            data = [len(node.edges)]
+            for label in sorted(node.edges):
+                target = node.edges[label]
+                data.append(label << 1 | int(target.final))
+                data.append(offsets[target.id])
+            fp.write(struct.pack(b'<{}I'.format(len(data)), *data))
+
+
+def is_dawg(path):
+    """
+    Check if a file is a DAWG word list as created by make_dawg.
+    """
+    mm = alg.mapped_dictionary(path)
+    return mm[:len(dawg_magic)] == dawg_magic
+
+
+class DAWG(object):
+    """
+    A read-only, memory mapped DAWG word list as created by make_dawg.
+
+    The underlying map is shared with all other dictionary users of the
+    process (see nidaba.algorithms.string.mapped_dictionary).
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _edges(self, mm, node):
+        cnt = struct.unpack_from(b'<I', mm, 4 * node)[0]
+        return struct.unpack_from(b'<{}I'.format(2 * cnt), mm, 4 * node + 4)
+
+    def _walk(self, mm, prefix):
+        """
+        Returns the node reached by prefix and if prefix is a word or (None,
+        False) if no word starts with prefix.
+        """
+        _, _, node, final = _dawg_header.unpack_from(mm, 0)
+        for c in prefix:
+            edges = self._edges(mm, node)
+            labels = edges[::2]
+            code = ord(c) << 1
+            i = bisect.bisect_left(labels, code)
+            if i == len(labels) or labels[i] >> 1 != ord(c):
+                return None, False
+            final = labels[i] & 1
+            node = edges[2 * i + 1]
+        return node, bool(final)
+
+    def __contains__(self, word):
+        return self._walk(alg.mapped_dictionary(self.path), word)[1]
+
+    def iterprefix(self, prefix=u''):
+        """
+        Iterates in ascending order over all words starting with prefix.
+
+        Args:
+            prefix (unicode): Common prefix of all returned words.
+
+        Yields:
+            unicode: Words starting with prefix.
+        """
+        mm = alg.mapped_dictionary(self.path)
+        node, final = self._walk(mm, prefix)
+        if node is None:
+            return
+        if final:
+            yield prefix
+        stack = [(prefix, node, 0)]
+        while stack:
+            word, node, i = stack.pop()
+            edges = self._edges(mm, node)
+            if i * 2 >= len(edges):
+                continue
+            stack.append((word, node, i + 1))
+            label, target = edges[2 * i], edges[2 * i + 1]
+            child = word + unichr(label >> 1)
+            if label & 1:
+                yield child
+            stack.append((child, target, 0))
+
+    def __iter__(self):
+        return self.iterprefix()
+
+    def search(self, word, max_distance):
+        """
+        Finds all words within a maximum Levenshtein distance of a string.
+
+        The automaton is walked depth first while computing one row of the
+        edit distance matrix per edge. Branches whose row minimum exceeds the
+        maximum distance can't lead to any matches and are pruned.
+
+        Args:
+            word (unicode): The string to search for.
+            max_distance (int): The maximum edit distance of a match.
+
+        Returns:
+            A dictionary mapping matching words to their edit distance.
+        """
+        mm = alg.mapped_dictionary(self.path)
+        _, _, root, final = _dawg_header.unpack_from(mm, 0)
+        row = range(len(word) + 1)
+        matches = {}
+        if final and row[-1] <= max_distance:
+            matches[u''] = row[-1]
+        stack = [(u'', root, row)]
+        while stack:
+            prefix, node, row = stack.pop()
+            edges = self._edges(mm, node)
+            for i in xrange(0, len(edges), 2):
+                label, target = edges[i], edges[i + 1]
+                c = unichr(label >> 1)
+                new_row = [row[0] + 1]
+                for j in xrange(1, len(row)):
+                    new_row.append(min(new_row[j - 1] + 1, row[j] + 1,
+                                       row[j - 1] + (word[j - 1] != c)))
+                if label & 1 and new_row[-1] <= max_distance:
+                    matches[prefix + c] = new_row[-1]
+                if min(new_row) <= max_distance:
+                    stack.append((prefix + c, target, new_row))
+        return matches
+
+
+def levenshtein_suggest(ustr, dawg, depth):
+    """
+    Generates spelling suggestions by searching a DAWG for all words within a
+    given edit distance.
+
+    Args:
+        ustr (unicode): The misspelled string.
+        dawg (DAWG): The word list to search.
+        depth (int): Maximum edit distance of suggestions.
+
+    Returns:
+        A dictionary of the form returned by
+        nidaba.algorithms.string.mapped_sym_suggest. Suggestions reachable
+        only by deleting characters from ustr are in 'dels', those reachable
+        only by inserting characters in 'ins', and all others in 'subs'.
+    """
+    deletes = set()
+    inserts = set()
+    subs = set()
+    for word, distance in dawg.search(ustr, depth).iteritems():
+        if len(ustr) - len(word) == distance:
+            deletes.add(word)
+        elif len(word) - len(ustr) == distance:
+            inserts.add(word)
+        else:
+            subs.add(word)
+    return {u'dels': deletes, u'ins': inserts, u'subs': subs,
+            u'ins+dels': set()}
+
+
+def known_words(tokens, dictionary):
+    """
+    Returns the subset of tokens contained in a dictionary.
+
+    Args:
+        tokens (iterable): An iterable returning unicode strings.
+        dictionary (unicode): Path to either a plain dictionary or a DAWG.
+
+    Returns:
+        set: The tokens contained in the dictionary.
+    """
+    if is_dawg(dictionary):
+        dawg = DAWG(dictionary)
+        return set(tok for tok in tokens if tok in dawg)
+    return set(alg.mmap_bulk_search(tokens, dictionary,
+                                    entryparser_fn=alg.key_for_single_word))
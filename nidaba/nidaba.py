@@ -14,7 +14,7 @@ from nidaba.nidabaexceptions import (NidabaInputException,
                                      NidabaTickException, NidabaStepException)
 
 from celery import chord, chain
-from inspect import getcallargs
+from inspect import getcallargs, getargspec
 from collections import OrderedDict, Iterable
 from requests_toolbelt.multipart import encoder
 from redis import WatchError
@@ -26,11 +26,19 @@ import requests
 import itertools
 
 
-def task_arg_validator(arg_values, **kwargs):
+def task_arg_validator(arg_values, optional=(), **kwargs):
     """
     Validates keyword arguments against the list of valid argument values
     contained in the task definition.
 
+    Arguments named in optional, usually those with a default value in the
+    task's signature, may be omitted. Integers are accepted for float ranges.
+
+    Args:
+        arg_values (dict): Valid argument values of the task.
+        optional (iterable): Names of arguments that may be omitted.
+        **kwargs: Arguments to the task.
+
     Raises:
         NidabaInputException if validation failed.
     """
@@ -58,8 +66,13 @@ def task_arg_validator(arg_values, **kwargs):
         try:
             val = kwc.pop(k)
         except:
+            if k in optional:
+                continue
             raise NidabaInputException('Missing argument: {}'.format(k))
         if isinstance(v, tuple):
+            if isinstance(v[0], float) and isinstance(val, (int, long)) and \
+               not isinstance(val, bool):
+                val = float(val)
             if not isinstance(val, type(v[0])):
                 raise NidabaInputException('{} of different type than range fields'.format(val))
             if val < v[0] or val > v[1]:
@@ -401,7 +414,9 @@ class Batch(object):
         except TypeError as e:
             raise NidabaInputException(str(e))
         # validate against arg_values field of the task
-        task_arg_validator(task.get_valid_args(), **kwargs)
+        spec = getargspec(task.run)
+        optional = spec.args[len(spec.args) - len(spec.defaults or ()):]
+        task_arg_validator(task.get_valid_args(), optional, **kwargs)
         with self.redis.pipeline() as pipe:
             while(1):
                 try:
@@ -9,12 +9,14 @@ Various postprocessing tasks that operate upon recognized texts.
 
 from __future__ import unicode_literals, print_function, absolute_import
 
+import nidaba.algorithms.string as alg
+
 from nidaba import storage
 from nidaba import merge_hocr
 from nidaba import lex
 from nidaba.celery import app
 from nidaba.tei import OCRRecord
-from nidaba.config import nidaba_cfg
+from nidaba.config import nidaba_cfg, Redis
 from nidaba.tasks.helper import NidabaTask
 
 from celery.utils.log import get_task_logger
@@ -24,9 +26,12 @@ logger = get_task_logger(__name__)
 
 @app.task(base=NidabaTask, name=u'nidaba.postprocessing.spell_check',
           arg_values={'language': nidaba_cfg['lang_dicts'].keys(),
-                      'filter_punctuation': [True, False]})
+                      'filter_punctuation': [True, False],
+                      'confidence_threshold': (0.0, 100.0),
+                      'grapheme_confidence_threshold': (0.0, 100.0)})
 def spell_check(doc, method=u'spell_check', language=u'',
-                filter_punctuation=False):
+                filter_punctuation=False, confidence_threshold=None,
+                grapheme_confidence_threshold=None):
     """
     Adds spelling suggestions to an TEI XML document.
 
@@ -35,6 +40,10 @@ def spell_check(doc, method=u'spell_check', language=u'',
     beneath a sic element.  Correct words, i.e. words appearing verbatim in the
     dictionary, are left untouched.
 
+    Segments recognized with a confidence at or above confidence_threshold
+    and/or consisting only of graphemes with a confidence at or above
+    grapheme_confidence_threshold are considered correct and not looked up.
+
     Args:
         doc (unicode, unicode): The input document tuple.
         method (unicode): The suffix string appended to the output file.
@@ -42,21 +51,103 @@ def spell_check(doc, method=u'spell_check', language=u'',
                             valid dictionary.
         filter_punctuation (bool): Switch to filter punctuation inside
                                    ``seg``
+        confidence_threshold (float): Minimal segment confidence (0-100) of
+                                      segments that are skipped.
+        grapheme_confidence_threshold (float): Minimal grapheme confidence
+                                               (0-100) of segments that are
+                                               skipped.
     Returns:
         (unicode, unicode): Storage tuple of the output document
     """
     input_path = storage.get_abs_path(*doc)
     output_path = storage.insert_suffix(input_path, method, language,
                                         unicode(filter_punctuation))
-    dictionary = storage.get_abs_path(*nidaba_cfg['lang_dicts'][language]['dictionary'])
-    del_dictionary = storage.get_abs_path(*nidaba_cfg['lang_dicts'][language]['deletion_dictionary'])
+    lang_dict = nidaba_cfg['lang_dicts'][language]
+    dictionary = storage.get_abs_path(*lang_dict['dictionary'])
+    # dictionaries stay mapped between tasks executed by the same worker
+    alg.mapped_dictionary(dictionary, warm=lang_dict.get('preload', False))
+    if lang_dict.get('engine', 'symmetric_delete') == 'levenshtein':
+        del_dictionary = None
+    else:
+        del_dictionary = storage.get_abs_path(*lang_dict['deletion_dictionary'])
+        alg.mapped_dictionary(del_dictionary, warm=lang_dict.get('preload', False))
+    cache = _suggestion_cache(lang_dict, dictionary, del_dictionary)
     with storage.StorageFile(*doc) as fp:
         logger.debug('Reading TEI ({})'.format(fp.abs_path))
         tei = OCRRecord()
         tei.load_tei(fp)
         logger.debug('Performing spell check')
         ret = lex.tei_spellcheck(tei, dictionary, del_dictionary,
-                                 filter_punctuation)
+                                 filter_punctuation,
+                                 lang_dict.get('depth', 1),
+                                 lang_dict.get('script'),
+                                 lang_dict.get('max_suggestions'),
+                                 cache, confidence_threshold,
+                                 grapheme_confidence_threshold,
+                                 lang_dict.get('jobs', 1))
+    if cache is not None:
+        logger.debug('Suggestion cache: {hit_rate:.1%} hit rate ({hits} hits, '
+                     '{shared_hits} shared hits, {misses} misses, '
+                     '{size}/{maxsize} tokens)'.format(**cache.info()))
+    with storage.StorageFile(*storage.get_storage_path(output_path), mode='wb') as fp:
+        logger.debug('Writing TEI ({})'.format(fp.abs_path))
+        ret.write_tei(fp)
+    return storage.get_storage_path(output_path)
+
+
+def _suggestion_cache(lang_dict, dictionary, del_dictionary):
+    """
+    Returns the suggestion cache configured for a language or None.
+    """
+    shared = lang_dict.get('shared_cache')
+    if 'cache_size' not in lang_dict and shared is None:
+        return None
+    if shared == 'redis':
+        store = lex.RedisSuggestionStore(Redis)
+    elif shared is not None:
+        store = lex.DiskSuggestionStore(storage.get_abs_path(*shared))
+    else:
+        store = None
+    return lex.suggestion_cache(dictionary, del_dictionary,
+                                lang_dict.get('depth', 1),
+                                lang_dict.get('cache_size',
+                                              lex.suggestion_cache_size),
+                                store)
+
+
+@app.task(base=NidabaTask, name=u'nidaba.postprocessing.tag_scripts',
+          arg_values={'scripts': alg.scripts.keys(),
+                      'threshold': (0.0, 1.0),
+                      'overwrite': [True, False]})
+def tag_scripts(doc, method=u'tag_scripts', scripts=None, threshold=0.5,
+                overwrite=False):
+    """
+    Tags the segments of a TEI XML document with the script they are written
+    in.
+
+    The script is written into the language field of each segment and
+    allows a spell checker configured with a script to skip segments in
+    other scripts.
+
+    Args:
+        doc (unicode, unicode): The input document tuple.
+        method (unicode): The suffix string appended to the output file.
+        scripts (list): Scripts to choose from. Defaults to all known
+                        scripts.
+        threshold (float): Minimal fraction of characters of a segment in
+                           the predominant script.
+        overwrite (bool): Switch to replace languages set by the OCR engine.
+    Returns:
+        (unicode, unicode): Storage tuple of the output document
+    """
+    input_path = storage.get_abs_path(*doc)
+    output_path = storage.insert_suffix(input_path, method)
+    with storage.StorageFile(*doc) as fp:
+        logger.debug('Reading TEI ({})'.format(fp.abs_path))
+        tei = OCRRecord()
+        tei.load_tei(fp)
+    logger.debug('Tagging segment scripts')
+    ret = lex.tei_tag_scripts(tei, scripts, threshold, overwrite)
     with storage.StorageFile(*storage.get_storage_path(output_path), mode='wb') as fp:
         logger.debug('Writing TEI ({})'.format(fp.abs_path))
         ret.write_tei(fp)
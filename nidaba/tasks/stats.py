@@ -19,6 +19,7 @@ import nidaba.algorithms.string as alg
 from lxml import html
 from pyxdameraulevenshtein import normalized_damerau_levenshtein_distance, damerau_levenshtein_distance
 
+from nidaba import lex
 from nidaba import storage
 from nidaba.celery import app
 from nidaba.tei import OCRRecord
@@ -50,6 +51,45 @@ def find_matching(doc, ground_truths):
     return sorted(ground_truths, cmp=cmp_prefix)[0]
 
 
+def load_text_and_ground_truth(doc, ground_truth, xml_in, gt_format,
+                               clean_in, clean_gt):
+    """
+    Reads the text of an input document and its ground truth.
+
+    Returns:
+        A tuple (text, ground truth text, ground truth storage tuple).
+    """
+    if not isinstance(ground_truth[0], basestring):
+        ground_truth = find_matching(doc, ground_truth)
+    with storage.StorageFile(*ground_truth) as fp:
+        if gt_format == 'tei':
+            tei = OCRRecord()
+            tei.load_tei(fp)
+            t = StringIO.StringIO()
+            tei.write_text(t)
+            gt = t.getvalue()
+        elif gt_format == 'hocr':
+            gt = html.parse(fp).text_content()
+        elif gt_format == 'text':
+            gt = fp.read()
+        else:
+            raise NidabaInvalidParameterException('Input format ' + gt_format + ' unknown.')
+    with storage.StorageFile(*doc) as fp:
+        if xml_in:
+            tei = OCRRecord()
+            tei.load_tei(fp)
+            t = StringIO.StringIO()
+            tei.write_text(t)
+            text = t.getvalue()
+        else:
+            text = fp.read()
+    if clean_in:
+        text = cleanup(text)
+    if clean_gt:
+        gt = cleanup(gt)
+    return text, gt, ground_truth
+
+
 @app.task(base=NidabaTask, name=u'nidaba.stats.text_diff_ratio',
           arg_values={'ground_truth': 'files',
                       'xml_in': [True, False],
@@ -89,34 +129,9 @@ def text_diff_ratio(doc, method=u'text_diff_ratio', ground_truth=None,
     input_path = storage.get_abs_path(*doc[0])
     output_path = storage.insert_suffix(input_path, method,
                                         os.path.basename(input_path))
-    if not isinstance(ground_truth[0], basestring):
-        ground_truth = find_matching(doc, ground_truth)
-    with storage.StorageFile(*ground_truth) as fp:
-        if gt_format == 'tei':
-            tei = OCRRecord()
-            tei.load_tei(fp)
-            t = StringIO.StringIO()
-            tei.write_text(t)
-            gt = t.getvalue()
-        elif gt_format == 'hocr':
-            gt = html.parse(fp).text_content()
-        elif gt_format == 'text':
-            gt = fp.read()
-        else:
-            raise NidabaInvalidParameterException('Input format ' + gt_format + ' unknown.')
-    with storage.StorageFile(*doc) as fp:
-        if xml_in:
-            tei = OCRRecord()
-            tei.load_tei(fp)
-            t = StringIO.StringIO()
-            tei.write_text(t)
-            text = t.getvalue()
-        else:
-            text = fp.read()
-    if clean_in:
-        text = cleanup(text)
-    if clean_gt:
-        gt = cleanup(gt)
+    text, gt, ground_truth = load_text_and_ground_truth(doc, ground_truth,
+                                                        xml_in, gt_format,
+                                                        clean_in, clean_gt)
     logger.debug('Recognition result: \n{}'.format(text))
     logger.debug('Ground truth: \n{}'.format(gt))
     sm = difflib.SequenceMatcher()
@@ -174,18 +189,19 @@ def text_lexicality(doc, method=u'text_lexicality', language=u'', divert=True):
     input_path = storage.get_abs_path(*doc[0])
     output_path = storage.insert_suffix(input_path, method,
                                         os.path.basename(input_path))
-    dictionary = storage.get_abs_path(*nidaba_cfg['lang_dicts'][language]['dictionary'])
+    lang_dict = nidaba_cfg['lang_dicts'][language]
+    dictionary = storage.get_abs_path(*lang_dict['dictionary'])
+    alg.mapped_dictionary(dictionary, warm=lang_dict.get('preload', False))
     with storage.StorageFile(*doc) as fp:
         tei = OCRRecord()
         tei.load_tei(fp)
-    cnt = 0
-    err_cnt = 0
-    for seg_id, segment in facsimile.segments.iteritems():
-        tok = alg.sanitize(''.join(x['grapheme'] for x in segment['content'].itervalues()))
-        tok = regex.sub('[^\w]', '', key)
-        cnt += 1
-        if not alg.mmap_bin_search(tok, dictionary, entryparser_fn=alg.key_for_single_word):
-            err_cnt += 1
+    toks = []
+    for seg_id, segment in tei.segments.iteritems():
+        tok = alg.cached_sanitize(''.join(x['grapheme'] for x in segment['content'].itervalues()))
+        toks.append(regex.sub('[^\w]', '', tok))
+    words = lex.known_words(toks, dictionary)
+    cnt = len(toks)
+    err_cnt = sum(1 for tok in toks if tok not in words)
     if not divert:
         storage.write_text(*storage.get_storage_path(output_path),
                            text=unicode(err_cnt / float(cnt)))
@@ -233,34 +249,9 @@ def text_edit_ratio(doc, method=u'text_edit_ratio', ground_truth=None,
     input_path = storage.get_abs_path(*doc[0])
     output_path = storage.insert_suffix(input_path, method,
                                         os.path.basename(input_path))
-    if not isinstance(ground_truth[0], basestring):
-        ground_truth = find_matching(doc, ground_truth)
-    with storage.StorageFile(*ground_truth) as fp:
-        if gt_format == 'tei':
-            tei = OCRRecord()
-            tei.load_tei(fp)
-            t = StringIO.StringIO()
-            tei.write_text(t)
-            gt = t.getvalue()
-        elif gt_format == 'hocr':
-            gt = html.parse(fp).text_content()
-        elif gt_format == 'text':
-            gt = fp.read()
-        else:
-            raise NidabaInvalidParameterException('Input format ' + gt_format + ' unknown.')
-    with storage.StorageFile(*doc) as fp:
-        if xml_in:
-            tei = OCRRecord()
-            tei.load_tei(fp)
-            t = StringIO.StringIO()
-            tei.write_text(t)
-            text = t.getvalue()
-        else:
-            text = fp.read()
-    if clean_in:
-        text = cleanup(text)
-    if clean_gt:
-        gt = cleanup(gt)
+    text, gt, ground_truth = load_text_and_ground_truth(doc, ground_truth,
+                                                        xml_in, gt_format,
+                                                        clean_in, clean_gt)
     logger.debug('Recognition result: \n{}'.format(text))
     logger.debug('Ground truth: \n{}'.format(gt))
     edist = 1.0 - normalized_damerau_levenshtein_distance(text, gt)
@@ -272,3 +263,58 @@ def text_edit_ratio(doc, method=u'text_edit_ratio', ground_truth=None,
         return output_path
     else:
         return {'edit_ratio': edist, 'ground_truth': ground_truth, 'doc': doc}
+
+
+@app.task(base=NidabaTask, name=u'nidaba.stats.text_char_accuracy',
+          arg_values={'ground_truth': 'files',
+                      'xml_in': [True, False],
+                      'gt_format': ['tei', 'hocr', 'text'],
+                      'clean_in': [True, False],
+                      'clean_gt': [True, False],
+                      'divert': [True, False]})
+def text_char_accuracy(doc, method=u'text_char_accuracy', ground_truth=None,
+                       xml_in=True, gt_format='tei', clean_in=True,
+                       clean_gt=True, divert=True):
+    """
+    Calculates the character accuracy of the input documents in relation to a
+    given ground truth, i.e. the fraction of ground truth characters not
+    affected by an edit operation. The texts are aligned with an anchor based
+    alignment so even full pages are processed in almost linear time.
+
+    Args:
+        doc (unicode, unicode): The input document tuple
+        method (unicode): The suffix string appended to the output file.
+        ground_truth (unicode): Ground truth location tuple or a list of ground
+                                truths to choose from. When more than one is
+                                given, the file sharing the longest prefix with
+                                the input document is chosen.
+        xml_in (bool): Switch to treat input as an TEI-XML document.
+        gt_format (unicode): Switch to select ground truth format. Valid values
+                             are 'tei', 'hocr', and 'text'.
+        clean_in (bool): Normalize to NFD and strip input data. (DO NOT DISABLE!)
+        clean_gt (bool): Normalize to NFD and strip ground truth. (DO NOT DISABLE!)
+        divert (bool): Switch selecting output diversion. If enabled the output
+                       will be added to the tracking arguments and the input
+                       document will be returned as the result of the task. Use
+                       this to insert a statistical measure into a chain
+                       without affecting the results.
+
+    Returns:
+        (unicode, unicode): Storage tuple of the output document
+    """
+    input_path = storage.get_abs_path(*doc[0])
+    output_path = storage.insert_suffix(input_path, method,
+                                        os.path.basename(input_path))
+    text, gt, ground_truth = load_text_and_ground_truth(doc, ground_truth,
+                                                        xml_in, gt_format,
+                                                        clean_in, clean_gt)
+    errors = sum(1 for op in alg.anchored_align(text, gt) if op != 'm')
+    accuracy = max(0.0, 1.0 - errors / float(max(len(gt), 1)))
+    logger.debug('Character errors: {}'.format(errors))
+    logger.debug('Accuracy: {}'.format(accuracy))
+    if not divert:
+        storage.write_text(*storage.get_storage_path(output_path),
+                           text=unicode(accuracy))
+        return output_path
+    else:
+        return {'edit_ratio': accuracy, 'ground_truth': ground_truth, 'doc': doc}
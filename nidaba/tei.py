@@ -143,6 +143,31 @@ class OCRRecord(object):
         self.segment_scope = None
 
         self.lines = OrderedDict()
+        self._reindex()
+
+    def _reindex(self):
+        """
+        Rebuilds the element index and id counters from the lines of the
+        record.
+
+        The index maps the id of each line, segment, and grapheme to a tuple
+        (line id, segment id, element) with the segment id being None for
+        lines and graphemes placed directly on a line.
+        """
+        self._elements = {}
+        self._line_cnt = self._seg_cnt = self._gr_cnt = 0
+        for line_id, line in self.lines.iteritems():
+            self._elements[line_id] = (line_id, None, line)
+            self._line_cnt += 1
+            for el_id, el in line['content'].iteritems():
+                self._elements[el_id] = (line_id, None, el)
+                if el['type'] == 'segment':
+                    self._seg_cnt += 1
+                    for g_id, gr in el['content'].iteritems():
+                        self._elements[g_id] = (line_id, el_id, gr)
+                        self._gr_cnt += 1
+                else:
+                    self._gr_cnt += 1
 
     # generic setter/getter for metadata
     def _generic_getter(self, field):
@@ -208,12 +233,14 @@ class OCRRecord(object):
         Returns:
             A string containing the line's identifier.
         """
-        id = u'line_' + unicode(len(self.lines) + 1)
+        self._line_cnt += 1
+        id = u'line_' + unicode(self._line_cnt)
         kwargs['bbox'] = dim
         kwargs['content'] = OrderedDict()
         if self.resp_scope:
             kwargs['resp'] = self.resp_scope
         self.lines[id] = kwargs
+        self._elements[id] = (id, None, kwargs)
         self.line_scope = id
         return id
 
@@ -236,7 +263,8 @@ class OCRRecord(object):
         """
         if not self.line_scope:
             raise NidabaRecordException('No line scoped.')
-        id = u'seg_' + unicode(len(self.segments) + 1)
+        self._seg_cnt += 1
+        id = u'seg_' + unicode(self._seg_cnt)
         kwargs['type'] = 'segment'
         kwargs['bbox'] = dim
         if language:
@@ -251,6 +279,7 @@ class OCRRecord(object):
 
         kwargs['content'] = OrderedDict()
         self.lines[self.line_scope]['content'][id] = kwargs
+        self._elements[id] = (self.line_scope, None, kwargs)
         self.segment_scope = id
         return id
 
@@ -276,11 +305,9 @@ class OCRRecord(object):
             target = self.lines[self.line_scope]['content'][self.segment_scope]['content']
         else:
             target = self.lines[self.line_scope]['content']
-        gr_cnt = len(self.graphemes)
         ids = []
         for glyph in it:
-            gr_cnt += 1
-            id = u'grapheme_' + unicode(gr_cnt)
+            id = u'grapheme_' + unicode(self._gr_cnt + 1)
             ids.append(id)
             glyph['type'] = 'grapheme'
             if 'confidence' in glyph and (glyph['confidence'] < 0 or
@@ -292,6 +319,8 @@ class OCRRecord(object):
             if self.resp_scope:
                 glyph['resp'] = self.resp_scope
             target[id] = glyph
+            self._elements[id] = (self.line_scope, self.segment_scope, glyph)
+            self._gr_cnt += 1
         return ids
 
     def add_choices(self, id, it):
@@ -307,16 +336,9 @@ class OCRRecord(object):
         Raises:
             NidabaRecordException if no element with the ID could be found.
         """
-        if id in self.lines:
-            target = self.lines[id]
-        for line in self.lines.itervalues():
-            if id in line['content']:
-                target = line['content'][id]
-                break
-            for seg in line['content'].itervalues():
-                if 'content' in seg and id in seg['content']:
-                    target = seg['content'][id]
-                    break
+        if id not in self._elements:
+            raise NidabaRecordException('Invalid element ID.')
+        target = self._elements[id][2]
         alt = {'content': list(it)}
         if self.resp_scope:
             alt['resp'] = self.resp_scope
@@ -346,13 +368,13 @@ class OCRRecord(object):
             id (unicode): ID of the segment to scope.
 
         Raises
+            NidabaRecordException if no segment with the ID could be found.
         """
-        for line_id, line in self.lines.iteritems():
-            if id in line['content']:
-                self.line_scope = line_id
-                self.segment_scope = id
-                return
-        raise NidabaRecordException('Invalid segment ID.')
+        if id not in self._elements or \
+           self._elements[id][2].get('type') != 'segment':
+            raise NidabaRecordException('Invalid segment ID.')
+        self.line_scope = self._elements[id][0]
+        self.segment_scope = id
 
     def reset_line_scope(self):
         """
@@ -374,6 +396,7 @@ class OCRRecord(object):
         """
         self.reset_line_scope()
         self.lines = OrderedDict()
+        self._reindex()
 
     def clear_segments(self):
         """
@@ -383,6 +406,7 @@ class OCRRecord(object):
         self.segment_scope = None
         for line in self.lines.itervalues():
             line['content'] = OrderedDict()
+        self._reindex()
 
     def clear_graphemes(self):
         """
@@ -395,6 +419,7 @@ class OCRRecord(object):
                     break
                 else:
                     seg['content'] = OrderedDict()
+        self._reindex()
 
     # properties offering short cuts (line are already top-level records)
     @property
@@ -471,14 +496,7 @@ class OCRRecord(object):
         last_el = None
 
         def _get_dict_from_key(id):
-            if id in self.lines:
-                return self.lines[id]
-            for line in self.lines.itervalues():
-                if id in line['content']:
-                    return line['content'][id]
-                for seg in line['content'].itervalues():
-                    if 'content' in seg and id in seg['content']:
-                        return seg['content'][id]
+            return self._elements[id][2]
 
         for el in islice(root_zone.iter(), 1, None):
             if el.tag != self.tei_ns + 'corr' and corr_flag:
@@ -503,7 +521,8 @@ class OCRRecord(object):
                 if el.get('resp') is not None:
                     self.scope_respstmt(el.get('resp')[1:])
                 id = self.add_segment((int(el.get('ulx')), int(el.get('uly')),
-                                       int(el.get('lrx')), int(el.get('lry'))))
+                                       int(el.get('lrx')), int(el.get('lry'))),
+                                      language=el.get(self.xml_ns + 'lang'))
                 last_el = _get_dict_from_key(id)
                 sic = id if not sic else None
             elif el.tag == self.tei_ns + 'zone' and el.get('type') == 'grapheme':
@@ -633,6 +652,8 @@ class OCRRecord(object):
                                      lry=str(seg['bbox'][3]),
                                      type=seg['type'])
                     seg_el.set(self.xml_ns + 'id', seg_id)
+                    if 'language' in seg:
+                        seg_el.set(self.xml_ns + 'lang', seg['language'])
                     _set_confidence(seg_el, seg, seg)
                     for grapheme_id, grapheme in seg['content'].iteritems():
                         _add_grapheme(grapheme_id, grapheme, seg_el)
@@ -3,10 +3,18 @@ import unittest
 import os
 import tempfile
 import shutil
+import multiprocessing
 
 from mock import patch, MagicMock
 
 
+def _daemonic_spellcheck(queue, lex, tokens, dic, del_dic):
+    try:
+        queue.put(lex.spellcheck(tokens, dic, del_dic, jobs=2))
+    except Exception as e:
+        queue.put(repr(e))
+
+
 class DictTests(unittest.TestCase):
 
     """
@@ -165,6 +173,540 @@ class DictTests(unittest.TestCase):
         self.assertEqual(u'dd\tddd', lines[3])
         outfile.close()
 
+    def test_make_dict_line_index(self):
+        """
+        Test that make_dict writes a line offset index.
+        """
+        from nidaba.algorithms import string
+        words = [u'a', u'bb', u'd', u'αχιλλεύς']
+        outpath = os.path.join(self.tempdir, u'testdict')
+        self.lex.make_dict(outpath, words)
+        with open(string.line_index_path(outpath), 'rb') as fp:
+            idx = fp.read()
+        offsets = [string.line_offset.unpack_from(idx, i)[0] for i in
+                   range(0, len(idx), string.line_offset.size)]
+        end = 7 + len(u'αχιλλεύς\n'.encode('utf-8'))
+        self.assertEqual([0, 2, 5, 7, end], offsets)
+        for word in words:
+            self.assertEqual(word, string.mmap_bin_search(word, outpath,
+                             entryparser_fn=string.key_for_single_word))
+        string.close_mapped_dictionaries()
+
+    def test_make_line_index(self):
+        """
+        Test that make_line_index recreates the index written by
+        make_deldict.
+        """
+        from nidaba.algorithms import string
+        outpath = os.path.join(self.tempdir, u'testdeldict')
+        self.lex.make_deldict(outpath, [u'aaa', u'abc', u'bcd'], 1)
+        with open(string.line_index_path(outpath), 'rb') as fp:
+            expected = fp.read()
+        os.unlink(string.line_index_path(outpath))
+        self.lex.make_line_index(outpath)
+        with open(string.line_index_path(outpath), 'rb') as fp:
+            self.assertEqual(expected, fp.read())
+
+    def test_make_dict_replaces_mapped(self):
+        """
+        Test that rebuilding a mapped dictionary leaves the old map intact.
+        """
+        from nidaba.algorithms import string
+        outpath = os.path.join(self.tempdir, u'testdict')
+        self.lex.make_dict(outpath, [u'a', u'b'], frequencies={u'a': 1})
+        old = string.mapped_dictionary(outpath)
+        inode = os.stat(outpath).st_ino
+        self.lex.make_dict(outpath, [u'cc', u'dd', u'ee'],
+                           frequencies={u'cc': 2})
+        self.assertNotEqual(inode, os.stat(outpath).st_ino)
+        self.assertEqual(b'a\nb\n', old[:])
+        self.assertEqual(b'cc\ndd\nee\n',
+                         string.mapped_dictionary(outpath)[:])
+        self.assertEqual([u'testdict', u'testdict.freq', u'testdict.idx'],
+                         sorted(os.listdir(self.tempdir)))
+        string.close_mapped_dictionaries()
+
+    def test_spellcheck(self):
+        """
+        Test the spellcheck function.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_deldict(del_dic, words, 1)
+        ret = self.lex.spellcheck([u'foo', u'bar ', u'fo', u'bax', u'xyz'],
+                                  dic, del_dic)
+        self.assertEqual({u'fo': [u'foo'], u'bax': [u'bar', u'baz'],
+                          u'xyz': []}, ret)
+        ret = self.lex.spellcheck([u'fo', u'bax'], dic, del_dic,
+                                  distances=True)
+        self.assertEqual({u'fo': [(u'foo', 1)],
+                          u'bax': [(u'bar', 1), (u'baz', 1)]}, ret)
+
+    def test_spellcheck_frequencies(self):
+        """
+        Test that spellcheck ranks suggestions of equal edit distance by the
+        frequency column of the dictionary and caps them.
+        """
+        from nidaba.algorithms import string
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words, frequencies={u'bar': 1, u'baz': 5})
+        self.lex.make_deldict(del_dic, words, 1)
+        with open(string.frequency_column_path(dic), 'rb') as fp:
+            self.assertEqual(3 * string.frequency_entry.size,
+                             len(fp.read()))
+        ret = self.lex.spellcheck([u'bax'], dic, del_dic)
+        self.assertEqual({u'bax': [u'baz', u'bar']}, ret)
+        ret = self.lex.spellcheck([u'bax', u'fo'], dic, del_dic,
+                                  distances=True, max_suggestions=1)
+        self.assertEqual({u'bax': [(u'baz', 1)], u'fo': [(u'foo', 1)]}, ret)
+        string.close_mapped_dictionaries()
+
+    def test_spellcheck_cache(self):
+        """
+        Test that spellcheck returns the same suggestions with a cache and
+        takes repeated tokens from it.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_deldict(del_dic, words, 1)
+        cache = self.lex.suggestion_cache(dic, del_dic, 1)
+        self.assertIs(cache, self.lex.suggestion_cache(dic, del_dic, 1))
+        self.assertIsNot(cache, self.lex.suggestion_cache(dic, del_dic, 2))
+        tokens = [u'foo', u'fo', u'bax', u'xyz']
+        expected = self.lex.spellcheck(tokens, dic, del_dic)
+        self.assertEqual(expected, self.lex.spellcheck(tokens, dic, del_dic,
+                                                       cache=cache))
+        self.assertEqual(expected, self.lex.spellcheck(tokens, dic, del_dic,
+                                                       cache=cache))
+        self.assertEqual({u'bax': [(u'bar', 1)]},
+                         self.lex.spellcheck([u'bax'], dic, del_dic,
+                                             distances=True,
+                                             max_suggestions=1, cache=cache))
+        info = cache.info()
+        self.assertEqual((5, 0, 4, 4), (info['hits'], info['shared_hits'],
+                                        info['misses'], info['size']))
+        self.assertAlmostEqual(5 / 9.0, info['hit_rate'])
+
+    def test_spellcheck_jobs(self):
+        """
+        Test that spellcheck returns the same suggestions when the tokens
+        are checked by multiple processes.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo', u'αχιλλεύς']
+        self.lex.make_dict(dic, sorted(words))
+        self.lex.make_deldict(del_dic, words, 1)
+        tokens = [u'foo', u'fo', u'bax', u'xyz', u'ba', u'αχιλεύς']
+        expected = self.lex.spellcheck(tokens, dic, del_dic, distances=True)
+        with patch.object(self.lex, '_spellcheck_shard_size', 1):
+            self.assertEqual(expected, self.lex.spellcheck(tokens, dic,
+                                                           del_dic,
+                                                           distances=True,
+                                                           jobs=2))
+
+    def test_spellcheck_jobs_daemonic(self):
+        """
+        Test that spellcheck checks all tokens itself in a daemonic process
+        which may not start a pool.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_deldict(del_dic, words, 1)
+        tokens = [u'foo', u'fo', u'bax', u'xyz']
+        expected = self.lex.spellcheck(tokens, dic, del_dic)
+        queue = multiprocessing.Queue()
+        with patch.object(self.lex, '_spellcheck_shard_size', 1):
+            proc = multiprocessing.Process(target=_daemonic_spellcheck,
+                                           args=(queue, self.lex, tokens,
+                                                 dic, del_dic))
+            proc.daemon = True
+            proc.start()
+            ret = queue.get(timeout=30)
+            proc.join()
+        self.assertEqual(expected, ret)
+
+    def test_spellcheck_jobs_billiard(self):
+        """
+        Test that spellcheck creates its pool with billiard in daemonic
+        billiard processes, e.g. Celery workers.
+        """
+        from multiprocessing.dummy import Pool
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_deldict(del_dic, words, 1)
+        tokens = [u'foo', u'fo', u'bax', u'xyz']
+        expected = self.lex.spellcheck(tokens, dic, del_dic)
+        billiard = MagicMock()
+        billiard.current_process.return_value.daemon = True
+        billiard.Pool.side_effect = Pool
+        with patch.dict('sys.modules', {'billiard': billiard}), \
+                patch.object(self.lex, '_spellcheck_shard_size', 1):
+            self.assertEqual(expected, self.lex.spellcheck(tokens, dic,
+                                                           del_dic, jobs=2))
+        billiard.Pool.assert_called_once_with(2)
+
+    def test_disk_suggestion_store(self):
+        """
+        Test that suggestions written to a disk store by one cache are found
+        by another one and survive merging runs.
+        """
+        store = self.lex.DiskSuggestionStore(self.tempdir, max_runs=2)
+        a = self.lex.SuggestionCache(u'ident', store=store)
+        b = self.lex.SuggestionCache(u'ident', store=store)
+        a.update({u'bax': [(u'bar', 1), (u'baz', 1)], u'foo': None})
+        a.update({u'fo': [(u'foo', 1)]})
+        a.update({u'bax': [(u'baz', 1)], u'αχιλεύς': [(u'αχιλλεύς', 1)]})
+        self.assertEqual(1, len(os.listdir(os.path.join(self.tempdir,
+                                                        u'ident'))) // 2)
+        self.assertEqual({u'bax': [(u'baz', 1)], u'foo': None,
+                          u'fo': [(u'foo', 1)],
+                          u'αχιλεύς': [(u'αχιλλεύς', 1)]},
+                         b.get_many([u'bax', u'foo', u'fo', u'αχιλεύς',
+                                     u'xyz']))
+        self.assertEqual({}, store.get_many(u'other', [u'bax']))
+        self.assertEqual((4, 1), (b.info()['shared_hits'],
+                                  b.info()['misses']))
+        # runs stay mapped outside the dictionary registry until removed
+        from nidaba.algorithms import string
+        run, = store._runs(u'ident')
+        self.assertIn(run, self.lex._mapped_runs)
+        self.assertNotIn(run, string._mapped_dictionaries)
+        store.clear(u'ident')
+        self.assertNotIn(run, self.lex._mapped_runs)
+        self.assertEqual({}, store.get_many(u'ident', [u'bax']))
+        store.set_many(u'ident', {u'a\tb': None})
+        self.assertEqual([], store._runs(u'ident'))
+
+    def test_redis_suggestion_store(self):
+        """
+        Test the encoding of suggestions in a Redis store.
+        """
+        redis = MagicMock()
+        pipe = redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.return_value = [True, 3]
+        store = self.lex.RedisSuggestionStore(redis, max_entries=2)
+        store.set_many(u'ident', {u'bax': [(u'bar', 1)], u'foo': None})
+        pipe.hmset.assert_called_once_with(u'nidaba:spellcheck:ident',
+                                           {b'bax': b'[["bar", 1]]',
+                                            b'foo': b'null'})
+        redis.delete.assert_called_once_with(u'nidaba:spellcheck:ident')
+        redis.hmget.return_value = [b'[["bar", 1]]', None, b'null']
+        self.assertEqual({u'bax': [(u'bar', 1)], u'foo': None},
+                         store.get_many(u'ident', [u'bax', u'xyz', u'foo']))
+
+    def test_make_deldict_external(self):
+        """
+        Test that make_deldict_external creates the same dictionary as
+        make_deldict when spilling and merging multiple runs.
+        """
+        words = [u'abc', u'abd', u'bcd', u'αχιλλεύς', u'acd', u'abc', u'bd']
+        expected = os.path.join(self.tempdir, u'expected')
+        outpath = os.path.join(self.tempdir, u'external')
+        self.lex.make_deldict(expected, words, 1)
+        with patch.object(self.lex, '_merge_fan_in', 2):
+            self.lex.make_deldict_external(outpath, words, 1, memory=0.001,
+                                           tmpdir=self.tempdir)
+        for suffix in (u'', u'.idx'):
+            with open(expected + suffix, 'rb') as a, \
+                    open(outpath + suffix, 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+        self.assertEqual(sorted([u'expected', u'expected.idx', u'external',
+                                 u'external.idx']),
+                         sorted(os.listdir(self.tempdir)))
+
+    def test_make_deldict_external_jobs(self):
+        """
+        Test that make_deldict_external creates the same dictionary as
+        make_deldict with multiple worker processes.
+        """
+        words = [u'abc', u'abd', u'bcd', u'αχιλλεύς', u'acd', u'abc', u'bd',
+                 u'cde', u'ace', u'xyz']
+        expected = os.path.join(self.tempdir, u'expected')
+        outpath = os.path.join(self.tempdir, u'external')
+        self.lex.make_deldict(expected, words, 1)
+        self.lex.make_deldict_external(outpath, words, 1, memory=0.002,
+                                       tmpdir=self.tempdir, jobs=2)
+        with open(expected, 'rb') as a, open(outpath, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual(4, len(os.listdir(self.tempdir)))
+
+    def test_make_deldict_external_cleanup(self):
+        """
+        Test that make_deldict_external removes all runs and raises the
+        original exception when merging or a worker fails.
+        """
+        words = [u'abc', u'abd', u'bcd', u'αχιλλεύς', u'acd', u'bd', u'cde',
+                 u'ace']
+        outpath = os.path.join(self.tempdir, u'external')
+        with patch.object(self.lex, '_merge_fan_in', 2), \
+                patch.object(self.lex, '_deldict_entries',
+                             side_effect=ValueError('merge')):
+            with self.assertRaisesRegexp(ValueError, 'merge'):
+                self.lex.make_deldict_external(outpath, words, 1,
+                                               memory=0.001,
+                                               tmpdir=self.tempdir)
+        self.assertEqual([], os.listdir(self.tempdir))
+        with self.assertRaises(TypeError):
+            self.lex.make_deldict_external(outpath, words + [None], 1,
+                                           memory=0.002, tmpdir=self.tempdir,
+                                           jobs=2)
+        self.assertEqual([], os.listdir(self.tempdir))
+
+    def test_make_hashed_deldict(self):
+        """
+        Test that a hashed deletion dictionary contains the same entries as
+        the deletion dictionary it is compiled from.
+        """
+        from nidaba.algorithms import string
+        words = [u'abc', u'abd', u'bcd', u'αχιλλεύς', u'acd', u'bd']
+        del_dict = os.path.join(self.tempdir, u'del_dict')
+        hashed = os.path.join(self.tempdir, u'hashed')
+        self.lex.make_deldict(del_dict, words, 1)
+        self.lex.make_hashed_deldict(hashed, del_dict)
+        self.assertTrue(string.is_hashed_del_dict(hashed))
+        self.assertFalse(string.is_hashed_del_dict(del_dict))
+        self.assertLess(os.path.getsize(hashed), 4096)
+        for line in open(del_dict, 'rb'):
+            key, val = line.decode('utf-8').rstrip(u'\n').split(u'\t')
+            self.assertEqual(val.split(u' '),
+                             string.hashed_del_dict_lookup(key, hashed))
+        self.assertEqual(None, string.hashed_del_dict_lookup(u'xyz', hashed))
+        self.assertEqual(None, string.hashed_del_dict_lookup(u'', hashed))
+        string.close_mapped_dictionaries()
+
+    def test_spellcheck_hashed(self):
+        """
+        Test the spellcheck function with a hashed deletion dictionary.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        hashed = os.path.join(self.tempdir, u'hashed')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_deldict(del_dic, words, 1)
+        self.lex.make_hashed_deldict(hashed, del_dic)
+        tokens = [u'foo', u'bar ', u'fo', u'bax', u'xyz', u'fooo']
+        self.assertEqual(self.lex.spellcheck(tokens, dic, del_dic),
+                         self.lex.spellcheck(tokens, dic, hashed))
+
+    def test_dawg(self):
+        """
+        Test membership tests and prefix iteration on a DAWG.
+        """
+        words = [u'bar', u'bars', u'baz', u'car', u'cars', u'foo',
+                 u'αχιλλεύς']
+        dawg = os.path.join(self.tempdir, u'dawg')
+        self.lex.make_dawg(dawg, words)
+        self.assertTrue(self.lex.is_dawg(dawg))
+        d = self.lex.DAWG(dawg)
+        for word in words:
+            self.assertIn(word, d)
+        for word in [u'', u'b', u'ba', u'barss', u'bat', u'fo', u'x']:
+            self.assertNotIn(word, d)
+        self.assertEqual(words, list(d))
+        self.assertEqual([u'bar', u'bars', u'baz'], list(d.iterprefix(u'ba')))
+        self.assertEqual([u'bar', u'bars'], list(d.iterprefix(u'bar')))
+        self.assertEqual([], list(d.iterprefix(u'x')))
+
+    def test_dawg_unsorted(self):
+        """
+        Test that make_dawg rejects unsorted word lists.
+        """
+        from nidaba.nidabaexceptions import NidabaAlgorithmException
+        with self.assertRaises(NidabaAlgorithmException):
+            self.lex.make_dawg(os.path.join(self.tempdir, u'dawg'),
+                               [u'b', u'a'])
+
+    def test_spellcheck_dawg(self):
+        """
+        Test the spellcheck function with a DAWG word list.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        dawg = os.path.join(self.tempdir, u'dawg')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_dawg(dawg, words)
+        self.lex.make_deldict(del_dic, words, 1)
+        tokens = [u'foo', u'bar ', u'fo', u'bax', u'xyz', u'fooo']
+        self.assertEqual(self.lex.spellcheck(tokens, dic, del_dic),
+                         self.lex.spellcheck(tokens, dawg, del_dic))
+
+    def test_dawg_search(self):
+        """
+        Test the DAWG Levenshtein search against brute force edit distances.
+        """
+        from nidaba.algorithms import string
+        words = [u'bar', u'bars', u'baz', u'car', u'cars', u'foo', u'fooo',
+                 u'oo']
+        dawg = os.path.join(self.tempdir, u'dawg')
+        self.lex.make_dawg(dawg, words)
+        d = self.lex.DAWG(dawg)
+        for query in [u'', u'bar', u'bax', u'cbars', u'fo', u'xyz']:
+            for k in range(3):
+                expected = {}
+                for word in words:
+                    dist = string.edit_distance(query, word)
+                    if dist <= k:
+                        expected[word] = dist
+                self.assertEqual(expected, d.search(query, k))
+
+    def test_spellcheck_levenshtein(self):
+        """
+        Test the spellcheck function without a deletion dictionary.
+        """
+        dawg = os.path.join(self.tempdir, u'dawg')
+        self.lex.make_dawg(dawg, [u'bar', u'baz', u'foo', u'fooba'])
+        ret = self.lex.spellcheck([u'foo', u'fo', u'bax', u'xyz', u'fooo',
+                                   u'fob'], dawg, None)
+        self.assertEqual({u'fo': [u'foo'], u'bax': [u'bar', u'baz'],
+                          u'xyz': [], u'fooo': [u'foo'], u'fob': [u'foo']},
+                         ret)
+        ret = self.lex.spellcheck([u'fob'], dawg, None, depth=2)
+        self.assertEqual({u'fob': [u'foo', u'fooba']}, ret)
+        sug = self.lex.levenshtein_suggest(u'fob', self.lex.DAWG(dawg), 2)
+        self.assertEqual({u'dels': set(), u'ins': set([u'fooba']),
+                          u'subs': set([u'foo']), u'ins+dels': set()}, sug)
+
+    def test_spellcheck_levenshtein_distances(self):
+        """
+        Test that suggestions from the DAWG are ranked with the edit
+        distances found by its search.
+        """
+        from nidaba.algorithms import string
+        dawg = os.path.join(self.tempdir, u'dawg')
+        self.lex.make_dawg(dawg, [u'bar', u'baz', u'fob', u'foo', u'fooba'])
+        with patch.object(string, 'edit_distances') as edit_distances:
+            ret = self.lex.spellcheck([u'fo'], dawg, None, depth=3)
+        self.assertFalse(edit_distances.called)
+        self.assertEqual({u'fo': [u'fob', u'foo', u'bar', u'baz', u'fooba']},
+                         ret)
+
+    def test_spellcheck_levenshtein_no_dawg(self):
+        """
+        Test that spellcheck without a deletion dictionary requires a DAWG.
+        """
+        from nidaba.nidabaexceptions import NidabaInvalidParameterException
+        dic = os.path.join(self.tempdir, u'dic')
+        self.lex.make_dict(dic, [u'bar'])
+        with self.assertRaises(NidabaInvalidParameterException):
+            self.lex.spellcheck([u'baz'], dic, None)
+
+    def _record(self, words):
+        from nidaba.tei import OCRRecord
+        record = OCRRecord()
+        record.add_line((0, 0, 0, 0))
+        for word in words:
+            record.add_segment((0, 0, 0, 0))
+            record.add_graphemes([{'grapheme': c} for c in word])
+        return record
+
+    def test_tei_tag_scripts(self):
+        """
+        Test that segments are tagged with their script.
+        """
+        record = self._record([u'Πλάτων', u'Plato', u'1.', u'x'])
+        record.segments['seg_4']['language'] = u'eng'
+        self.lex.tei_tag_scripts(record)
+        self.assertEqual([u'greek', u'latin', None, u'eng'],
+                         [seg.get('language') for seg in
+                          record.segments.itervalues()])
+        self.lex.tei_tag_scripts(record, overwrite=True)
+        self.assertEqual(u'latin', record.segments['seg_4']['language'])
+
+    def test_tei_tag_scripts_nothing_to_tag(self):
+        """
+        Test tagging records without segments or with all segments tagged
+        already.
+        """
+        from nidaba.tei import OCRRecord
+        record = OCRRecord()
+        self.assertIs(record, self.lex.tei_tag_scripts(record))
+        record.add_line((0, 0, 0, 0))
+        record.add_segment((0, 0, 0, 0), language=u'grc')
+        record.add_graphemes([{'grapheme': c} for c in u'Plato'])
+        self.lex.tei_tag_scripts(record)
+        self.assertEqual(u'grc', record.segments['seg_1']['language'])
+
+    def test_tei_spellcheck_script(self):
+        """
+        Test that tei_spellcheck skips segments in other scripts.
+        """
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo', u'βαρ']
+        self.lex.make_dict(dic, sorted(words))
+        self.lex.make_deldict(del_dic, words, 1)
+        record = self.lex.tei_tag_scripts(self._record([u'fo', u'βα']))
+        self.lex.tei_spellcheck(record, dic, del_dic, script=u'latin')
+        self.assertIn('alternatives', record.segments['seg_1'])
+        self.assertNotIn('alternatives', record.segments['seg_2'])
+
+    def test_tei_spellcheck_confidence(self):
+        """
+        Test that tei_spellcheck skips segments recognized with high
+        confidence.
+        """
+        from nidaba.tei import OCRRecord
+        dic = os.path.join(self.tempdir, u'dic')
+        del_dic = os.path.join(self.tempdir, u'del_dic')
+        words = [u'bar', u'baz', u'foo']
+        self.lex.make_dict(dic, words)
+        self.lex.make_deldict(del_dic, words, 1)
+
+        def record():
+            record = OCRRecord()
+            record.add_line((0, 0, 0, 0))
+            for conf, graphemes in ((95, (99, 99)), (95, (99, 50)),
+                                    (50, (99, 99)), (None, (99, 99))):
+                record.add_segment((0, 0, 0, 0), confidence=conf)
+                record.add_graphemes([{'grapheme': g, 'confidence': c} for
+                                      g, c in zip(u'fo', graphemes)])
+            return record
+
+        def checked(rec):
+            return [seg_id for seg_id, seg in rec.segments.iteritems() if
+                    'alternatives' in seg]
+
+        rec = self.lex.tei_spellcheck(record(), dic, del_dic,
+                                      confidence_threshold=90)
+        self.assertEqual([u'seg_3', u'seg_4'], checked(rec))
+        rec = self.lex.tei_spellcheck(record(), dic, del_dic,
+                                      grapheme_confidence_threshold=90)
+        self.assertEqual([u'seg_2'], checked(rec))
+        rec = self.lex.tei_spellcheck(record(), dic, del_dic,
+                                      confidence_threshold=90,
+                                      grapheme_confidence_threshold=90)
+        self.assertEqual([u'seg_2', u'seg_3', u'seg_4'], checked(rec))
+
+    def test_is_confident_segment(self):
+        """
+        Test that segments without graphemes are not confident about their
+        graphemes.
+        """
+        from collections import OrderedDict
+        segment = {'type': 'segment', 'confidence': 95,
+                   'content': OrderedDict()}
+        self.assertFalse(self.lex.is_confident_segment(segment))
+        self.assertTrue(self.lex.is_confident_segment(segment, 90))
+        self.assertFalse(self.lex.is_confident_segment(segment, None, 90))
+        self.assertFalse(self.lex.is_confident_segment(segment, 90, 90))
+        segment['content']['grapheme_1'] = {'grapheme': u'a'}
+        self.assertFalse(self.lex.is_confident_segment(segment, None, 90))
+        segment['content']['grapheme_1']['confidence'] = 95
+        self.assertTrue(self.lex.is_confident_segment(segment, 90, 90))
+
     def test_unique_words_with_frequency(self):
         """
         Test the uniquewords_with_freq function
@@ -180,5 +722,41 @@ class DictTests(unittest.TestCase):
         self.assertEqual(1, f['d'])
         self.assertEqual(2, f['foobar'])
 
+    def test_iter_cleanwords(self):
+        """
+        Test that the generator variants yield the same words as the list
+        functions.
+        """
+        import types
+        gen = self.lex.iter_cleanwords(self.path)
+        self.assertIsInstance(gen, types.GeneratorType)
+        self.assertEqual(self.lex.cleanwords(self.path), list(gen))
+        self.assertEqual(self.lex.cleanlines(self.path),
+                         list(self.lex.iter_cleanlines(self.path)))
+
+    def test_parallel_corpus(self):
+        """
+        Test that reading corpora with a process pool returns the same words
+        and frequencies.
+        """
+        corpus = os.path.join(self.tempdir, u'corpus')
+        os.mkdir(corpus)
+        for name, text in ((u'a.txt', u'foo bar baz\nβαρ foo\n' * 20),
+                           (u'b.txt', u'bar qux\nfoo')):
+            with open(os.path.join(corpus, name), 'wb') as fp:
+                fp.write(text.encode('utf-8'))
+        with patch.object(self.lex, '_corpus_chunk_size', 7):
+            self.assertEqual(self.lex.unique_words_from_files(corpus),
+                             self.lex.unique_words_from_files(corpus, jobs=2))
+            self.assertEqual(self.lex.word_frequencies_from_files(corpus),
+                             self.lex.word_frequencies_from_files(corpus,
+                                                                  jobs=2))
+            path = os.path.join(corpus, u'a.txt')
+            self.assertEqual(self.lex.uniquewords_with_freq(path),
+                             self.lex.uniquewords_with_freq(path, jobs=3))
+            self.assertEqual(self.lex.cleanuniquewords(path),
+                             self.lex.cleanuniquewords(path, jobs=3))
+        self.assertEqual(41, self.lex.word_frequencies_from_files(corpus)[u'foo'])
+
 if __name__ == '__main__':
     unittest.main()
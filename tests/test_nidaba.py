@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mock import patch, MagicMock
+
+
+class ValidatorTests(unittest.TestCase):
+
+    """
+    Tests for the task argument validator.
+    """
+
+    def setUp(self):
+        config_mock = MagicMock()
+        self.patcher = patch.dict('sys.modules', {'nidaba.config': config_mock})
+        self.addCleanup(self.patcher.stop)
+        self.patcher.start()
+        from nidaba import nidaba
+        from nidaba.nidabaexceptions import NidabaInputException
+        self.validator = nidaba.task_arg_validator
+        self.exception = NidabaInputException
+        # argument values and optional arguments of the spell_check task
+        self.arg_values = {'language': [u'latin', u'polytonic_greek'],
+                           'filter_punctuation': [True, False],
+                           'confidence_threshold': (0.0, 100.0),
+                           'grapheme_confidence_threshold': (0.0, 100.0)}
+        self.optional = ['method', 'language', 'filter_punctuation',
+                         'confidence_threshold',
+                         'grapheme_confidence_threshold']
+
+    def test_optional_arguments(self):
+        """
+        Test that arguments with default values may be omitted.
+        """
+        self.validator(self.arg_values, self.optional, language=u'latin',
+                       filter_punctuation=False)
+        self.validator(self.arg_values, self.optional, language=u'latin')
+        with self.assertRaises(self.exception):
+            self.validator(self.arg_values, language=u'latin',
+                           filter_punctuation=False)
+
+    def test_int_threshold(self):
+        """
+        Test that integers are accepted for float ranges.
+        """
+        self.validator(self.arg_values, self.optional, language=u'latin',
+                       confidence_threshold=90)
+        self.validator(self.arg_values, self.optional, language=u'latin',
+                       confidence_threshold=90.0,
+                       grapheme_confidence_threshold=50)
+        with self.assertRaises(self.exception):
+            self.validator(self.arg_values, self.optional, language=u'latin',
+                           confidence_threshold=101)
+        with self.assertRaises(self.exception):
+            self.validator(self.arg_values, self.optional, language=u'latin',
+                           confidence_threshold=u'90')
+
+if __name__ == '__main__':
+    unittest.main()
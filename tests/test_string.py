@@ -81,6 +81,54 @@ class LevenshteinTests(unittest.TestCase):
         # Should delete the a and add the final b.
         self.assertEqual(2, self.string.edit_distance('bbbbb', 'abbb'))
 
+    def test_max_distance(self):
+        """
+        Test that distances above max_distance are capped.
+        """
+        self.assertEqual(2, self.string.edit_distance('abbb', 'bbbbb',
+                                                      max_distance=2))
+        self.assertEqual(2, self.string.edit_distance('abbb', 'bbbbb',
+                                                      max_distance=1))
+        self.assertEqual(1, self.string.edit_distance('', 'aaaaaaaaaa',
+                                                      max_distance=0))
+        self.assertEqual(0, self.string.edit_distance('test', 'test',
+                                                      max_distance=0))
+
+    def test_myers_edit_distance(self):
+        """
+        Test the bit-parallel edit distance against the full matrix.
+        """
+        import random
+        rnd = random.Random(23)
+        for _ in range(300):
+            s1 = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 70)))
+            s2 = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 70)))
+            full = self.string.native_full_edit_distance(s1, s2)[0][-1][-1]
+            self.assertEqual(full, self.string.myers_edit_distance(s1, s2))
+            k = rnd.randint(0, 40)
+            self.assertEqual(min(full, k + 1),
+                             self.string.myers_edit_distance(s1, s2, k))
+
+    def test_banded_edit_distance(self):
+        """
+        Test the banded edit distance against the full matrix.
+        """
+        import random
+        rnd = random.Random(42)
+        for _ in range(300):
+            s1 = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 8)))
+            s2 = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 8)))
+            k = rnd.randint(0, 5)
+            full = self.string.edit_distance(s1, s2)
+            self.assertEqual(min(full, k + 1),
+                             self.string.banded_edit_distance(s1, s2, k))
+        self.assertEqual(4, self.string.banded_edit_distance('aa', 'bbb', 3,
+                                                             substitutionscore=2))
+        self.assertEqual(5, self.string.banded_edit_distance('aa', 'bbb', 5,
+                                                             substitutionscore=2,
+                                                             insertscore=1,
+                                                             deletescore=2))
+
     # -------------------------------------------------------------------
     # Score matrix tests ------------------------------------------------
     # -------------------------------------------------------------------
@@ -871,6 +919,30 @@ class NumpyAlignmentTests(unittest.TestCase):
         self.assertEqual(['m', 'm', 'm', 'm', 'm'], self.string.np_align(
             ['word1', 'word2', 'word3', 'word4', 'word5'], ['word1', 'word2', 'word3', 'word4', 'word5']))
 
+    def test_native_equivalence(self):
+        """
+        Test that the numpy and native implementations calculate the same
+        matrices and alignments.
+        """
+        import random
+        rnd = random.Random(7)
+        charmatrix = {('a', 'b'): 0.5, ('c', 'd'): 3, ('', 'a'): 2}
+        for _ in range(50):
+            s1 = ''.join(rnd.choice('abcd') for _ in range(rnd.randint(0, 10)))
+            s2 = ''.join(rnd.choice('abcd') for _ in range(rnd.randint(10, 14)))
+            for cm in ({}, charmatrix):
+                matrix, _ = self.string.np_full_edit_distance(s1, s2,
+                                                              insertscore=2,
+                                                              charmatrix=cm)
+                native, _ = self.string.native_full_edit_distance(s1, s2,
+                                                                  insertscore=2,
+                                                                  charmatrix=cm)
+                self.assertTrue(numpy.array_equal(numpy.array(native), matrix))
+                self.assertEqual(self.string.native_align(s1, s2, charmatrix=cm),
+                                 self.string.np_align(s1, s2, charmatrix=cm))
+                self.assertEqual(self.string.native_semi_global_align(s1, s2, charmatrix=cm),
+                                 self.string.np_semi_global_align(s1, s2, charmatrix=cm))
+
 
 class NumpySemiGlobalAlignmentTests(unittest.TestCase):
 
@@ -970,6 +1042,94 @@ class NumpySemiGlobalAlignmentTests(unittest.TestCase):
 # ----------------------------------------------------------------------
 
 
+class HirschbergAlignmentTests(unittest.TestCase):
+
+    """
+    Tests the linear memory alignment functions.
+    """
+    def setUp(self):
+        self.config_mock = MagicMock()
+        self.config_mock.nidaba.config.everything.log.return_value = True
+
+        modules = {
+            'nidaba.config': self.config_mock.config,
+        }
+
+        self.module_patcher = patch.dict('sys.modules', modules)
+        self.module_patcher.start()
+        from nidaba import nidabaexceptions
+        from nidaba.algorithms import string
+        self.string = string
+        self.exceptions = nidabaexceptions
+
+    def _cost(self, path):
+        return len([op for op in path if op != 'm'])
+
+    def test_examples(self):
+        """
+        Test against the examples of the other alignment functions.
+        """
+        self.assertEqual([], self.string.hirschberg_align('', ''))
+        self.assertEqual(['i', 'i'], self.string.hirschberg_align('', 'ab'))
+        self.assertEqual(['d', 'd'], self.string.hirschberg_align('ab', ''))
+        self.assertEqual(['s', 'm', 'm', 'm', 's', 'm', 'd'],
+                         self.string.hirschberg_align('sitting', 'kitten'))
+        self.assertEqual(['m', 'm'],
+                         self.string.hirschberg_align(['word1', 'word2'],
+                                                      ['word1', 'word2']))
+
+    def test_split(self):
+        """
+        Test that alignments split into subproblems are optimal.
+        """
+        import random
+        rnd = random.Random(5)
+        with patch.object(self.string, 'hirschberg_cutoff', 4):
+            for _ in range(50):
+                s1 = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 30)))
+                s2 = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 30)))
+                path = self.string.hirschberg_align(s1, s2)
+                self.assertEqual(len(s1), len([op for op in path if op != 'i']))
+                self.assertEqual(len(s2), len([op for op in path if op != 'd']))
+                self.assertEqual(self.string.edit_distance(s1, s2),
+                                 self._cost(path))
+
+    def test_semi_global(self):
+        """
+        Test the semi-global alignment.
+        """
+        self.assertEqual(['i', 'i', 'i', 'i', 'm'],
+                         self.string.hirschberg_semi_global_align('b',
+                                                                  'aaaabcccc'))
+        self.assertEqual(['i', 'm', 's', 'm'],
+                         self.string.hirschberg_semi_global_align('bxd',
+                                                                  'abcdef'))
+        self.assertRaises(self.exceptions.NidabaAlgorithmException,
+                          self.string.hirschberg_semi_global_align, 'ab', 'a')
+
+    def test_anchored_align(self):
+        """
+        Test that the anchored alignment finds the minimal edit script of
+        long, similar strings.
+        """
+        import random
+        rnd = random.Random(11)
+        s1 = ''.join(rnd.choice('abcdefghijklmnop ') for _ in range(500))
+        s2 = list(s1)
+        for _ in range(20):
+            s2[rnd.randrange(len(s2))] = 'x'
+        del s2[100:103]
+        s2.insert(300, 'y')
+        s2 = ''.join(s2)
+        path = self.string.anchored_align(s1, s2)
+        self.assertEqual(len(s1), len([op for op in path if op != 'i']))
+        self.assertEqual(len(s2), len([op for op in path if op != 'd']))
+        self.assertEqual(self.string.edit_distance(s1, s2), self._cost(path))
+        self.assertEqual(['s', 'm', 'm', 'm', 's', 'm', 'd'],
+                         self.string.anchored_align('sitting', 'kitten'))
+        self.assertEqual(['i', 'i'], self.string.anchored_align('', 'ab'))
+
+
 class LanguageTests(unittest.TestCase):
 
     def setUp(self):
@@ -1031,6 +1191,71 @@ class LanguageTests(unittest.TestCase):
         self.assertEqual({greek[0]: len(u'Πλάτων')},
                          self.string.identify(u'Πλάτων', [greek]))
 
+    def test_identify_overlapping(self):
+        """
+        Test that characters in overlapping blocks are counted in each.
+        """
+        blocks = [(u'lower', u'a', u'z'), (u'vowels', u'a', u'e'),
+                  (u'ascii', unichr(0), unichr(127))]
+        self.assertEqual({u'lower': 3, u'vowels': 2, u'ascii': 4},
+                         self.string.identify(u'abzA', blocks))
+        self.assertEqual([u'lower', u'vowels', u'ascii'],
+                         self.string.block_classifier(blocks).classify(u'c'))
+        self.assertEqual([], self.string.block_classifier(blocks).classify(u'\u03B1'))
+
+    def test_identify_many(self):
+        """
+        Test that identify_many returns the same counts as identify.
+        """
+        blocks = [self.string.greek_coptic_range, self.string.ascii_range]
+        strings = [u'Σωκράτης', u'', u'Πλάτων_ascii', u'ἀλλὰ']
+        self.assertEqual([self.string.identify(x, blocks) for x in strings],
+                         self.string.identify_many(strings, blocks))
+
+    def test_identify_many_empty(self):
+        """
+        Test that identify_many accepts an empty sequence.
+        """
+        blocks = [self.string.greek_coptic_range, self.string.ascii_range]
+        self.assertEqual([], self.string.identify_many([], blocks))
+        self.assertEqual([], self.string.identify_scripts([]))
+
+    def test_identify_byte_string(self):
+        """
+        Test that the bytes of byte strings are classified as code points.
+        """
+        blocks = [(u'ascii', unichr(0), unichr(127)),
+                  (u'latin1', unichr(128), unichr(255))]
+        self.assertEqual({u'ascii': 1, u'latin1': 2},
+                         self.string.identify(b'a\xce\xa0', blocks))
+        self.assertEqual([{u'ascii': 1, u'latin1': 2}, {u'ascii': 2,
+                                                         u'latin1': 0}],
+                         self.string.identify_many([b'a\xce\xa0', u'bc'],
+                                                   blocks))
+
+    def test_identify_many_astral(self):
+        """
+        Test that characters outside the basic multilingual plane are
+        counted like len() does on both narrow and wide builds.
+        """
+        blocks = [(u'all', unichr(0), unichr(0xffff))]
+        strings = [u'\U0001d4d0a', u'b', u'\U0001d4d0']
+        counts = self.string.identify_many(strings, blocks)
+        self.assertEqual([1, 1, 0] if len(strings[2]) == 1 else [3, 1, 2],
+                         [x[u'all'] for x in counts])
+
+    def test_identify_scripts(self):
+        """
+        Test script identification of multiple strings.
+        """
+        self.assertEqual([u'greek', u'latin', None, u'greek', None],
+                         self.string.identify_scripts([u'Πλάτων', u'Plato',
+                                                       u'123', u'Πλάτωνab',
+                                                       u'Πλabc'],
+                                                      threshold=0.7))
+        self.assertEqual([None], self.string.identify_scripts([u'Plato'],
+                                                              [u'greek']))
+
     def test_is_lang_threshhold_check(self):
         """
         Test that an exception is raised if an invalid threshold value
@@ -1126,6 +1351,27 @@ class LanguageTests(unittest.TestCase):
         self.assertEqual(
             u'\u03B0', self.string.sanitize(decomp_upsilon, normalization=u'NFC'))
 
+    def test_cached_sanitize(self):
+        """
+        Test that cached_sanitize memoizes results in a bounded cache.
+        """
+        self.string.clear_sanitize_cache()
+        with patch.object(self.string, 'sanitize_cache_size', 4):
+            self.assertEqual(u'\u03B1\u0301',
+                             self.string.cached_sanitize(u' \u03AC '))
+            self.assertEqual(u'\u03AC',
+                             self.string.cached_sanitize(u' \u03AC ',
+                                                         normalization=u'NFC'))
+            self.assertEqual(u'\u03B1\u0301',
+                             self.string.cached_sanitize(u' \u03AC '))
+            info = self.string.sanitize_cache_info()
+            self.assertEqual((1, 2), (info['hits'], info['misses']))
+            for word in (u'a', u'b', u'c', u'd'):
+                self.string.cached_sanitize(word)
+            self.assertLessEqual(self.string.sanitize_cache_info()['size'], 4)
+        self.string.clear_sanitize_cache()
+        self.assertEqual(0, self.string.sanitize_cache_info()['size'])
+
     def test_sanitize_decode(self):
         """
         Test that strings are converted to unicode correctly.
@@ -1161,6 +1407,22 @@ class LanguageTests(unittest.TestCase):
         self.assertNotEqual(len(diacritics), 0)
         self.assertEqual(u'', self.string.strip_diacritics(diacritics))
 
+    def test_greek_filter(self):
+        """
+        Test that greek_filter removes non-Greek characters.
+        """
+        self.assertEqual(u'Πλάτων', self.string.greek_filter(u'Πλάτων_ascii'))
+        self.assertEqual([u'Πλάτων', u''],
+                         self.string.greek_filter_many([u'Πλάτων 1', u'abc']))
+
+    def test_strip_diacritics_many(self):
+        """
+        Test the batch variant of strip_diacritics.
+        """
+        self.assertEqual([u'\u03b1', u'abc'],
+                         self.string.strip_diacritics_many([u'\u03b1\u0301',
+                                                            u'abc']))
+
 # ----------------------------------------------------------------------
 # Symmetric spell check tests ------------------------------------------
 # ----------------------------------------------------------------------
@@ -1204,6 +1466,20 @@ class SymSpellTests(unittest.TestCase):
         """
         self.assertEqual([], self.string.strings_by_deletion(u'aaa', 10))
 
+    def test_deletion_variants(self):
+        """
+        Test that deletion_variants yields each variant exactly once.
+        """
+        import itertools
+        for word in (u'', u'a', u'aaab', u'abab', u'mississippi',
+                     u'ἀλλὰ'):
+            for dels in range(0, len(word) + 2):
+                expected = set(u''.join(c for i, c in enumerate(word) if i not in comb)
+                               for comb in itertools.combinations(range(len(word)), dels))
+                variants = list(self.string.deletion_variants(word, dels))
+                self.assertEqual(len(expected), len(variants))
+                self.assertEqual(expected, set(variants))
+
     def test_sym_suggest_already_word(self):
         """
         Test sym_suggest in the case where the specified string is
@@ -1463,6 +1739,134 @@ class SymSpellTests(unittest.TestCase):
                          self.string.mmap_bin_search(u'dval', dpath,
                                                     entryparser_fn=self.string.key_for_single_word))
 
+    def test_mapped_dictionary_reuse(self):
+        """
+        Test that repeated lookups reuse the same dictionary map.
+        """
+        df = tempfile.NamedTemporaryFile()
+        df.write('akey\taval\n')
+        df.write('bkey\tbval\n')
+        df.seek(0, 0)
+        dpath = os.path.abspath(df.name).decode(u'utf-8')
+        mm = self.string.mapped_dictionary(dpath)
+        self.assertEqual(u'bval', self.string.mmap_bin_search(u'bkey', dpath))
+        self.assertIs(mm, self.string.mapped_dictionary(dpath))
+        self.string.close_mapped_dictionaries()
+        df.close()
+
+    def test_mapped_dictionary_modified(self):
+        """
+        Test that a dictionary is remapped after it has been changed.
+        """
+        df = tempfile.NamedTemporaryFile()
+        df.write('akey\taval\n')
+        df.seek(0, 0)
+        dpath = os.path.abspath(df.name).decode(u'utf-8')
+        self.assertEqual(None, self.string.mmap_bin_search(u'bkey', dpath))
+        df.seek(0, 2)
+        df.write('bkey\tbval\n')
+        df.seek(0, 0)
+        self.assertEqual(u'bval', self.string.mmap_bin_search(u'bkey', dpath))
+        self.string.close_mapped_dictionaries()
+        df.close()
+
+    def test_mapped_dictionary_eviction(self):
+        """
+        Test that the least recently used map is closed when the registry
+        is full.
+        """
+        files = [tempfile.NamedTemporaryFile() for _ in range(3)]
+        for df in files:
+            df.write('akey\taval\n')
+            df.seek(0, 0)
+        paths = [os.path.abspath(df.name).decode(u'utf-8') for df in files]
+        with patch.object(self.string, 'max_mapped_dictionaries', 2):
+            maps = [self.string.mapped_dictionary(p, warm=True) for p in paths]
+            self.assertNotIn(paths[0], self.string._mapped_dictionaries)
+            self.assertIs(maps[2], self.string.mapped_dictionary(paths[2]))
+            self.assertEqual(2, len(self.string._mapped_dictionaries))
+        self.string.close_mapped_dictionaries()
+        for df in files:
+            df.close()
+
+    def test_mmap_bin_search_line_index(self):
+        """
+        Test the mmap_bin_search function on a dictionary with a line
+        offset index and lines longer than the line buffer.
+        """
+        lines = ['akey\t' + ' '.join(['aval'] * 100) + '\n',
+                 'bkey\tbval\n',
+                 'ckey\t' + ' '.join(['cval'] * 100) + '\n']
+        df = tempfile.NamedTemporaryFile()
+        df.write(''.join(lines))
+        df.seek(0, 0)
+        dpath = os.path.abspath(df.name).decode(u'utf-8')
+        offset = 0
+        with open(self.string.line_index_path(dpath), 'wb') as idx:
+            for line in lines:
+                idx.write(self.string.line_offset.pack(offset))
+                offset += len(line)
+            idx.write(self.string.line_offset.pack(offset))
+        self.assertEqual(u' '.join([u'aval'] * 100),
+                         self.string.mmap_bin_search(u'akey', dpath,
+                                                     line_buffer_size=10))
+        self.assertEqual(u'bval', self.string.mmap_bin_search(u'bkey', dpath))
+        self.assertEqual(u' '.join([u'cval'] * 100),
+                         self.string.mmap_bin_search(u'ckey', dpath,
+                                                     line_buffer_size=10))
+        self.assertEqual(None, self.string.mmap_bin_search(u'0key', dpath))
+        self.assertEqual(None, self.string.mmap_bin_search(u'bkez', dpath))
+        self.assertEqual(None, self.string.mmap_bin_search(u'dkey', dpath))
+        self.string.close_mapped_dictionaries()
+        os.unlink(self.string.line_index_path(dpath))
+        df.close()
+
+    def test_mmap_bin_search_stale_line_index(self):
+        """
+        Test that a line offset index not matching its dictionary is
+        ignored.
+        """
+        df = tempfile.NamedTemporaryFile()
+        df.write('akey\taval\nbkey\tbval\n')
+        df.seek(0, 0)
+        dpath = os.path.abspath(df.name).decode(u'utf-8')
+        with open(self.string.line_index_path(dpath), 'wb') as idx:
+            idx.write(self.string.line_offset.pack(0))
+            idx.write(self.string.line_offset.pack(10))
+        self.assertEqual(u'bval', self.string.mmap_bin_search(u'bkey', dpath))
+        self.string.close_mapped_dictionaries()
+        os.unlink(self.string.line_index_path(dpath))
+        df.close()
+
+    def test_mmap_bulk_search(self):
+        """
+        Test the mmap_bulk_search function with and without a line offset
+        index.
+        """
+        lines = ['%skey\t%sval\n' % (c, c) for c in 'bcdfhijklmnp']
+        df = tempfile.NamedTemporaryFile()
+        df.write(''.join(lines))
+        df.seek(0, 0)
+        dpath = os.path.abspath(df.name).decode(u'utf-8')
+        queries = [u'pkey', u'akey', u'bkey', u'ckey', u'ekey', u'jkey',
+                   u'ckey', u'nkey', u'zkey']
+        expected = {u'bkey': u'bval', u'ckey': u'cval', u'jkey': u'jval',
+                    u'nkey': u'nval', u'pkey': u'pval'}
+        self.assertEqual(expected,
+                         self.string.mmap_bulk_search(queries, dpath))
+        offset = 0
+        with open(self.string.line_index_path(dpath), 'wb') as idx:
+            for line in lines:
+                idx.write(self.string.line_offset.pack(offset))
+                offset += len(line)
+            idx.write(self.string.line_offset.pack(offset))
+        self.assertEqual(expected,
+                         self.string.mmap_bulk_search(queries, dpath))
+        self.assertEqual({}, self.string.mmap_bulk_search([], dpath))
+        self.string.close_mapped_dictionaries()
+        os.unlink(self.string.line_index_path(dpath))
+        df.close()
+
 
 class SpellCheckTests(unittest.TestCase):
 
@@ -1576,6 +1980,27 @@ class SpellCheckTests(unittest.TestCase):
         self.assertEqual(len(result_b[u'subs']), 1)
         self.assertEqual(len(result_b[u'ins+dels']), 0)
 
+    def test_bulk_suggest(self):
+        """
+        Test that bulk_mapped_sym_suggest returns the same suggestions as
+        mapped_sym_suggest.
+        """
+        dic = tempfile.NamedTemporaryFile()
+        dic.write(u'1234\naaaaa\nbbbbb\n')
+        dic.seek(0, 0)
+        tokens = [u'', u'aaaa', u'bbbb', u'aaXaaa', u'Xbbbbb', u'aaXaa',
+                  u'Xbbbb', u'1X34']
+        result = self.string.bulk_mapped_sym_suggest(tokens,
+                                                     self.temp.name.decode('utf-8'),
+                                                     dic.name.decode('utf-8'), 1)
+        self.assertEqual(set(tokens), set(result))
+        for tok in tokens:
+            self.assertEqual(self.string.mapped_sym_suggest(tok,
+                                                            self.temp.name.decode('utf-8'),
+                                                            self.dic, 1),
+                             result[tok])
+        dic.close()
+
     def test_suggestions(self):
         """
         Test the suggestions function.
@@ -1593,5 +2018,56 @@ class SpellCheckTests(unittest.TestCase):
         self.assertEqual(expected, self.string.suggestions(
             orig, [s4, s4, s2, s2a, s0, s1, s1a, s3]))
 
+    def test_ranked_suggestions(self):
+        """
+        Test that ranked_suggestions returns the edit distances of the
+        suggestions.
+        """
+        self.assertEqual([(u'aaaa', 0), (u'baaa', 1), (u'aabb', 2),
+                          (u'cccc', 4)],
+                         self.string.ranked_suggestions(u'aaaa', [u'cccc',
+                                                                  u'aabb',
+                                                                  u'aaaa',
+                                                                  u'baaa']))
+
+    def test_ranked_suggestions_frequency(self):
+        """
+        Test that suggestions with the same edit distance are ranked by
+        descending frequency.
+        """
+        freq = {u'baaa': 1, u'caaa': 5, u'daaa': 5}
+        self.assertEqual([(u'caaa', 1), (u'daaa', 1), (u'baaa', 1),
+                          (u'eaaa', 1), (u'aabb', 2)],
+                         self.string.ranked_suggestions(u'aaaa', [u'aabb',
+                                                                  u'eaaa',
+                                                                  u'daaa',
+                                                                  u'baaa',
+                                                                  u'caaa'],
+                                                        freq))
+
+    def test_rank_distances(self):
+        """
+        Test that rank_distances sorts like ranked_suggestions.
+        """
+        freq = {u'baaa': 1, u'caaa': 5}
+        self.assertEqual([(u'caaa', 1), (u'baaa', 1), (u'eaaa', 1),
+                          (u'aabb', 2)],
+                         self.string.rank_distances([(u'aabb', 2),
+                                                     (u'eaaa', 1),
+                                                     (u'baaa', 1),
+                                                     (u'caaa', 1)], freq))
+
+    def test_edit_distances(self):
+        """
+        Test that edit_distances calculates the same distances as
+        edit_distance.
+        """
+        cands = [u'', u'a', u'kitten', u'sitting', u'mitten', u'αχιλλεύς']
+        for kwargs in ({}, {'max_distance': 2}, {'substitutionscore': 2}):
+            self.assertEqual([self.string.edit_distance(u'kitten', c, **kwargs)
+                              for c in cands],
+                             self.string.edit_distances(u'kitten', cands,
+                                                        **kwargs))
+
 if __name__ == '__main__':
     unittest.main()
@@ -137,6 +137,39 @@ class TEITests(unittest.TestCase):
         self.record.clear_lines()
         self.assertEqual(len(self.record.lines), 0)
 
+    def test_element_index(self):
+        """
+        Tests that ids, scoping, and alternatives stay consistent with the
+        element index after clearing parts of the record.
+        """
+        self.record.scope_segment('seg_10')
+        self.assertEqual(self.record.line_scope, 'line_10')
+        with self.assertRaises(NidabaRecordException):
+            self.record.scope_segment('grapheme_1')
+        with self.assertRaises(NidabaRecordException):
+            self.record.add_choices('seg_100', [])
+        self.assertEqual(self.record.add_segment((0, 0, 0, 0)), 'seg_12')
+        self.assertEqual(self.record.add_graphemes([{'grapheme': 'A'}]),
+                         ['grapheme_14'])
+
+        self.record.clear_graphemes()
+        self.assertEqual(self.record.add_graphemes([{'grapheme': 'A'}]),
+                         ['grapheme_1'])
+        self.record.add_choices('grapheme_1', [{'alternative': 'B'}])
+        self.assertIn('alternatives', self.record.segments['seg_12']['content']['grapheme_1'])
+
+        self.record.clear_segments()
+        with self.assertRaises(NidabaRecordException):
+            self.record.scope_segment('seg_1')
+        self.assertEqual(self.record.add_segment((0, 0, 0, 0)), 'seg_1')
+        self.record.add_choices('line_2', [{'alternative': 'B'}])
+        self.assertIn('alternatives', self.record.lines['line_2'])
+
+        self.record.clear_lines()
+        with self.assertRaises(NidabaRecordException):
+            self.record.add_choices('line_1', [])
+        self.assertEqual(self.record.add_line((0, 0, 0, 0)), 'line_1')
+
     def test_respstmt(self):
         """
         Tests responsibility statement methods.
@@ -248,6 +281,7 @@ class TEITests(unittest.TestCase):
         self.record2 = tei.OCRRecord()
         fp.seek(0)
         self.record2.load_tei(fp)
+        self.assertEqual(u'foo', self.record2.segments['seg_1']['language'])
         #self.assertEqual(record2, self.record)
 
     def test_hocr(self):